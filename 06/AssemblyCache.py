@@ -0,0 +1,189 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+import typing
+from array import array
+
+# Changing this invalidates every existing cache entry, and should be done
+# whenever the assembler's output for a given input changes.
+CACHE_VERSION = "4"
+CACHE_EXTENSION = ".cache"
+DEFAULT_MAX_CACHE_SIZE = 64 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+# An entry is the number of words, the words as little-endian 16-bit
+# integers, and the symbol map as JSON.
+ENTRY_HEADER = struct.Struct("<I")
+SYMBOL_MAP_KEYS = ("labels", "variables")
+
+
+class AssemblyCache:
+    """An on-disk cache of assembled programs, keyed by the content hash of
+    the assembly source. Every entry holds the machine words of the program
+    and its resolved symbol map (see SymbolTable.symbol_map). When the cache
+    grows beyond its maximal size, the least recently used entries are
+    evicted. Entries which can not be decoded count as misses, and are
+    removed.
+    """
+
+    def __init__(self, directory: str,
+                 max_size: int = DEFAULT_MAX_CACHE_SIZE) -> None:
+        """Opens the cache directory, creating it if it does not exist.
+
+        Args:
+            directory (str): the directory the entries are stored in.
+            max_size (int): the maximal total size of the entries, in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(input_path: str) -> str:
+        """
+        Args:
+            input_path (str): path of an assembly file.
+
+        Returns:
+            str: the cache key of the file's content.
+        """
+        digest = hashlib.sha256(CACHE_VERSION.encode())
+        with open(input_path, 'rb') as input_file:
+            for chunk in iter(lambda: input_file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def load(self, key: str) -> typing.Optional[
+            typing.Tuple[array, typing.Dict[str, typing.Dict[str, int]]]]:
+        """Looks up an entry, and counts the lookup as a hit or a miss.
+
+        Args:
+            key (str): the cache key of the assembly source.
+
+        Returns:
+            typing.Optional[typing.Tuple[array, typing.Dict[str, typing.Dict[
+            str, int]]]]: the machine words and the symbol map of the program,
+            or None if the entry is not cached.
+        """
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, 'rb') as entry_file:
+                entry = entry_file.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            words, symbols = self.decode(entry)
+        except (ValueError, KeyError, TypeError, struct.error):
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors.
+            self.misses += 1
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            return None
+        # Marks the entry as recently used.
+        os.utime(entry_path)
+        self.hits += 1
+        return words, symbols
+
+    @staticmethod
+    def decode(entry: bytes) -> typing.Tuple[
+            array, typing.Dict[str, typing.Dict[str, int]]]:
+        """
+        Args:
+            entry (bytes): the content of an entry file.
+
+        Returns:
+            typing.Tuple[array, typing.Dict[str, typing.Dict[str, int]]]: the
+            machine words and the symbol map of the program.
+
+        Raises:
+            ValueError: if the entry is malformed.
+        """
+        count, = ENTRY_HEADER.unpack_from(entry)
+        wordsEnd = ENTRY_HEADER.size + 2 * count
+        if len(entry) < wordsEnd:
+            raise ValueError("truncated cache entry")
+        words = array('H')
+        words.frombytes(entry[ENTRY_HEADER.size:wordsEnd])
+        if sys.byteorder == "big":
+            words.byteswap()
+        symbols = json.loads(entry[wordsEnd:].decode("utf-8"))
+        if not isinstance(symbols, dict) \
+                or set(symbols) != set(SYMBOL_MAP_KEYS) \
+                or not all(isinstance(symbols[key], dict) for key in SYMBOL_MAP_KEYS) \
+                or not all(isinstance(symbol, str) and isinstance(address, int)
+                           for key in SYMBOL_MAP_KEYS
+                           for symbol, address in symbols[key].items()):
+            raise ValueError("malformed symbol map in cache entry")
+        return words, symbols
+
+    def store(self, key: str, words: array,
+              symbols: typing.Dict[str, typing.Dict[str, int]]) -> None:
+        """Stores an entry. The entry is written to a temporary file first,
+        so concurrent readers never see a partially written entry.
+
+        Args:
+            key (str): the cache key of the assembly source.
+            words (array): the machine words of the program.
+            symbols (typing.Dict[str, typing.Dict[str, int]]): the symbol map
+                of the program.
+        """
+        entry_path = self.entry_path(key)
+        temporary_path = f"{entry_path}.{os.getpid()}.tmp"
+        binaryWords = array('H', words)
+        if sys.byteorder == "big":
+            binaryWords.byteswap()
+        with open(temporary_path, 'wb') as entry_file:
+            entry_file.write(ENTRY_HEADER.pack(len(binaryWords)))
+            entry_file.write(binaryWords.tobytes())
+            entry_file.write(json.dumps(symbols, separators=(",", ":")).encode("utf-8"))
+        os.replace(temporary_path, entry_path)
+
+    def entries(self) -> typing.List[os.DirEntry]:
+        return [entry for entry in os.scandir(self.directory)
+                if entry.name.endswith(CACHE_EXTENSION)]
+
+    def size(self) -> int:
+        """
+        Returns:
+            int: the total size of the entries, in bytes.
+        """
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the total size of the
+        cache is at most max_size.
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry.stat().st_mtime)
+        total_size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total_size <= self.max_size:
+                break
+            total_size -= entry.stat().st_size
+            os.remove(entry.path)
+            self.evictions += 1
+
+    def stats(self) -> str:
+        """
+        Returns:
+            str: a short human-readable report of the cache's usage.
+        """
+        return (f"cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.evictions} evictions, {len(self.entries())} entries, "
+                f"{self.size()} bytes")
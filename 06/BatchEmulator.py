@@ -0,0 +1,272 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import time
+import typing
+from Emulator import RAM_SIZE, WORD_MASK, SIGN_BIT, ADDRESS_SPACE_SIZE, \
+    INFINITE_LOOP_JUMP, alu_expression, shift_expression, load_words, \
+    read_snapshot
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# NumPy expressions for the value of a comp result for which each jump is
+# taken.
+BATCH_JUMP_CONDITIONS = {
+    1: "(out != 0) & (out < 0x8000)",
+    2: "out == 0",
+    3: "out < 0x8000",
+    4: "out >= 0x8000",
+    5: "out != 0",
+    6: "(out == 0) | (out >= 0x8000)"
+}
+
+
+def executor_source(word: int) -> str:
+    """Generates the source of a factory for the executors of a single
+    machine word. The factory takes the address which follows the
+    instruction, and returns an executor, which executes the instruction on
+    the given rows of the RAM and of the register arrays.
+
+    Args:
+        word (int): a machine word.
+
+    Returns:
+        str: the source of the factory, named "factory".
+    """
+    if not word & SIGN_BIT:
+        body = [f"A[rows] = {word}", "PC[rows] = nxt"]
+    else:
+        bits = f"{word:016b}"
+        compBits = bits[3:10]
+        if bits[1] == "0":
+            expression = shift_expression(compBits)
+        else:
+            expression = alu_expression(compBits)
+        destA, destD, destM = (bit == "1" for bit in bits[10:13])
+        jump = word & 0b111
+        # The registers are widened, so the scalar expressions, which mask
+        # their results to 16 bits, work unchanged on the arrays.
+        body = ["a = A[rows].astype(np.int64)", "d = D[rows].astype(np.int64)"]
+        if "m" in expression or destM:
+            body.append("address = a & 0x7FFF")
+        if "m" in expression:
+            body.append("m = RAM[rows, address].astype(np.int64)")
+        body.append(f"out = {expression}")
+        if destM:
+            body.append("RAM[rows, address] = out")
+        if destA:
+            body.append("A[rows] = out")
+        if destD:
+            body.append("D[rows] = out")
+        # The jump goes to the address A held before the instruction.
+        if jump == 0:
+            body.append("PC[rows] = nxt")
+        elif jump == 7:
+            body.append("PC[rows] = a")
+        else:
+            body.append(
+                f"PC[rows] = np.where({BATCH_JUMP_CONDITIONS[jump]}, a, nxt)")
+    return (
+        "def factory(nxt, np):\n"
+        "    def executor(RAM, A, D, PC, rows):\n"
+        + "".join(f"        {line}\n" for line in body)
+        + "    return executor\n"
+    )
+
+
+class BatchEmulator:
+    """Runs many instances of a headless Hack computer, with the CpuMul shift
+    instructions, in lockstep using NumPy, so that a program can be run on
+    many initial RAM states at once. The RAM of all the instances is a single
+    (instances, 32K) array of 16-bit words, and the registers are arrays with
+    a value for every instance. On every step, the instances are grouped by
+    their program counter, and every group executes its instruction at once;
+    when all the instances follow the same path, which is common for
+    data-parallel inputs, there is a single group. Like the Emulator, every
+    machine word is decoded once into a generated function, and an instance
+    halts when it leaves the ROM or reaches the usual halting loop.
+    """
+
+    # The executor factory of every machine word seen so far.
+    factories = {}
+
+    def __init__(self, words: typing.Iterable[int], instances: int) -> None:
+        """Loads a program into every instance, and resets them.
+
+        Args:
+            words (typing.Iterable[int]): the machine words of the program.
+            instances (int): the number of instances.
+        """
+        if np is None:
+            raise ImportError("the batch emulator requires NumPy")
+        self.rom = [word & WORD_MASK for word in words]
+        self.executors = [self.executor(address)
+                          for address in range(len(self.rom))]
+        # The addresses at which an instance halts.
+        self.stops = np.ones(ADDRESS_SPACE_SIZE, dtype=bool)
+        self.stops[:len(self.rom)] = False
+        for address in range(len(self.rom) - 1):
+            if self.rom[address] == address \
+                    and self.rom[address + 1] == INFINITE_LOOP_JUMP:
+                self.stops[address] = True
+        self.ram = np.zeros((instances, RAM_SIZE), dtype=np.int16)
+        # The executors work on unsigned words.
+        self.words = self.ram.view(np.uint16)
+        self.a = np.zeros(instances, dtype=np.uint16)
+        self.d = np.zeros(instances, dtype=np.uint16)
+        self.pc = np.zeros(instances, dtype=np.int32)
+        self.cycles = np.zeros(instances, dtype=np.int64)
+        self.halted = np.zeros(instances, dtype=bool)
+        self.reset()
+
+    @classmethod
+    def load(cls, input_path: str, instances: int) -> "BatchEmulator":
+        return cls(load_words(input_path), instances)
+
+    def executor(self, address: int) -> typing.Callable:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            typing.Callable: the executor of the instruction at the address.
+        """
+        word = self.rom[address]
+        factory = BatchEmulator.factories.get(word)
+        if factory is None:
+            namespace = {}
+            exec(executor_source(word), namespace)
+            factory = BatchEmulator.factories[word] = namespace["factory"]
+        return factory(address + 1, np)
+
+    def reset(self) -> None:
+        """Sets the registers and the program counters of all the instances
+        to 0. The RAM is kept."""
+        self.a[:] = 0
+        self.d[:] = 0
+        self.pc[:] = 0
+        self.cycles[:] = 0
+        self.halted[:] = self.stops[0]
+
+    def restore_snapshot(self, input_file: typing.BinaryIO) -> None:
+        """Restores the state saved by Emulator.save_snapshot into every
+        instance, so that they all continue from the same point.
+
+        Args:
+            input_file (typing.BinaryIO): the snapshot file.
+
+        Raises:
+            ValueError: see Emulator.read_snapshot.
+        """
+        (a, d, pc, cycles, halted), ram = read_snapshot(input_file, self.rom)
+        self.a[:] = a
+        self.d[:] = d
+        self.pc[:] = pc
+        self.cycles[:] = cycles
+        self.halted[:] = halted or self.stops[pc]
+        self.words[:] = np.frombuffer(ram, dtype=np.uint16)
+
+    def read(self, address: int) -> "np.ndarray":
+        """
+        Args:
+            address (int): a RAM address.
+
+        Returns:
+            np.ndarray: the signed value at the address in every instance.
+        """
+        return self.ram[:, address].copy()
+
+    def write(self, address: int, values: typing.Union[int, typing.Sequence[int]]) -> None:
+        """
+        Args:
+            address (int): a RAM address.
+            values (typing.Union[int, typing.Sequence[int]]): a signed or
+                unsigned 16-bit value for every instance, or a single value
+                for all of them.
+        """
+        self.words[:, address] = np.asarray(values, dtype=np.int64) & WORD_MASK
+
+    def run(self, max_steps: int) -> int:
+        """Executes steps until all the instances halt, or max_steps steps
+        were executed. On every step, every instance which did not halt
+        executes a single instruction.
+
+        Args:
+            max_steps (int): the maximal number of steps to execute.
+
+        Returns:
+            int: the number of steps executed.
+        """
+        executors, stops = self.executors, self.stops
+        ram, a, d, pc = self.words, self.a, self.d, self.pc
+        executed = 0
+        while executed < max_steps:
+            rows = np.flatnonzero(~self.halted)
+            if rows.size == 0:
+                break
+            pcs = pc[rows]
+            first = pcs[0]
+            if (pcs == first).all():
+                executors[first](ram, a, d, pc, rows)
+            else:
+                for address in np.unique(pcs):
+                    executors[address](ram, a, d, pc, rows[pcs == address])
+            self.cycles[rows] += 1
+            self.halted[rows] = stops[pc[rows]]
+            executed += 1
+        return executed
+
+
+if "__main__" == __name__:
+    # Runs a ".hack" or ".bin" program on many instances until they all halt,
+    # and prints the number of steps and instructions executed, the speed of
+    # the emulator and the values of the requested RAM addresses in every
+    # instance. Every --set gives an address, and either a single value for
+    # all the instances or a value for every instance. With --restore, all
+    # the instances start from an Emulator snapshot.
+    argument_parser = argparse.ArgumentParser(prog="BatchEmulator")
+    argument_parser.add_argument("input_path")
+    argument_parser.add_argument(
+        "--instances", type=int, metavar="N",
+        help="the number of instances, by default the longest --set")
+    argument_parser.add_argument(
+        "--steps", type=int, default=10 ** 7, metavar="N",
+        help="the maximal number of steps to execute")
+    argument_parser.add_argument(
+        "--set", nargs="+", type=int, action="append", default=[],
+        metavar="ADDRESS VALUE", help="set a RAM address before running")
+    argument_parser.add_argument(
+        "--ram", type=int, nargs="*", default=[], metavar="ADDRESS",
+        help="RAM addresses to print after running")
+    argument_parser.add_argument(
+        "--restore", metavar="PATH", help="start from a snapshot")
+    arguments = argument_parser.parse_args()
+    instances = arguments.instances or max(
+        [len(values) - 1 for values in arguments.set] + [1])
+    for values in arguments.set:
+        if len(values) < 2 or len(values) - 1 not in (1, instances):
+            argument_parser.error(
+                "--set takes an address and 1 or N values")
+    emulator = BatchEmulator.load(arguments.input_path, instances)
+    if arguments.restore is not None:
+        with open(arguments.restore, 'rb') as snapshot_file:
+            emulator.restore_snapshot(snapshot_file)
+    for address, *values in arguments.set:
+        emulator.write(address, values if len(values) > 1 else values[0])
+    start = time.perf_counter()
+    executed = emulator.run(arguments.steps)
+    elapsed = time.perf_counter() - start
+    total = int(emulator.cycles.sum())
+    print(f"{executed} steps, {total} instructions in {elapsed:.3f}s "
+          f"({total / max(elapsed, 1e-9) / 1e6:.2f}M/s), "
+          f"{int(emulator.halted.sum())} of {instances} instances halted")
+    for address in arguments.ram:
+        print(f"RAM[{address}] = {' '.join(map(str, emulator.read(address)))}")
@@ -9,6 +9,9 @@ Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
 
+    # A-instructions hold 15-bit constants, since their top bit is 0.
+    MAX_CONSTANT = 0x7FFF
+
     COMP_TRANSLATOR = {
         "0": "0101010",
         "1": "0111111",
@@ -37,9 +40,27 @@ class Code:
         "D&A": "0000000",
         "D&M": "1000000",
         "D|A": "0010101",
-        "D|M": "1010101"
+        "D|M": "1010101",
+        # The commutative forms, as emitted by the VM translator.
+        "A+D": "0000010",
+        "M+D": "1000010",
+        "A&D": "0000000",
+        "M&D": "1000000",
+        "A|D": "0010101",
+        "M|D": "1010101",
+        # The extended shift instructions of CpuMul (see EXTENDED_COMPS).
+        "A<<": "0100000",
+        "D<<": "0110000",
+        "M<<": "1100000",
+        "A>>": "0000000",
+        "D>>": "0010000",
+        "M>>": "1000000"
     }
 
+    # C-instructions start with "111", except for the extended instructions,
+    # which start with "101".
+    EXTENDED_COMPS = {"A<<", "D<<", "M<<", "A>>", "D>>", "M>>"}
+
     JUMP_TRANSLATOR = {
         None: "000",
         "JGT": "001",
@@ -51,6 +72,36 @@ class Code:
         "JMP": "111"
     }
 
+    DEST_TRANSLATOR = {
+        None: "000",
+        "M": "001",
+        "D": "010",
+        "MD": "011",
+        "DM": "011",
+        "A": "100",
+        "AM": "101",
+        "MA": "101",
+        "AD": "110",
+        "DA": "110",
+        "AMD": "111",
+        "ADM": "111",
+        "MAD": "111",
+        "MDA": "111",
+        "DAM": "111",
+        "DMA": "111"
+    }
+
+    # The complete 16-bit word of every valid C-instruction, keyed by its
+    # (dest, comp, jump) mnemonics.
+    C_INSTRUCTION_TRANSLATOR = {}
+    for _dest, _destBits in DEST_TRANSLATOR.items():
+        for _comp, _compBits in COMP_TRANSLATOR.items():
+            for _jump, _jumpBits in JUMP_TRANSLATOR.items():
+                _prefix = "101" if _comp in EXTENDED_COMPS else "111"
+                C_INSTRUCTION_TRANSLATOR[(_dest, _comp, _jump)] = int(
+                    f"{_prefix}{_compBits}{_destBits}{_jumpBits}", 2)
+    del _dest, _destBits, _comp, _compBits, _jump, _jumpBits, _prefix
+
     @staticmethod
     def dest(mnemonic: str) -> str:
         """
@@ -60,13 +111,7 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        if mnemonic is None:
-            return "000"
-        result = ''
-        result += '0' if mnemonic.find('A') == -1 else '1'
-        result += '0' if mnemonic.find('D') == -1 else '1'
-        result += '0' if mnemonic.find('M') == -1 else '1'
-        return result
+        return Code.DEST_TRANSLATOR[mnemonic]
 
     @staticmethod
     def comp(mnemonic: str) -> str:
@@ -90,3 +135,32 @@ class Code:
         """
         return Code.JUMP_TRANSLATOR[mnemonic]
 
+    @staticmethod
+    def c_instruction(dest: str, comp: str, jump: str) -> int:
+        """
+        Args:
+            dest (str): a dest mnemonic string.
+            comp (str): a comp mnemonic string.
+            jump (str): a jump mnemonic string.
+
+        Returns:
+            int: the complete 16-bit machine word of the C-instruction.
+        """
+        return Code.C_INSTRUCTION_TRANSLATOR[(dest, comp, jump)]
+
+    @staticmethod
+    def a_instruction(symbol: str, value: int) -> int:
+        """
+        Args:
+            symbol (str): the symbol or the constant of an A-instruction.
+            value (int): the value of the symbol.
+
+        Returns:
+            int: the machine word of the A-instruction.
+
+        Raises:
+            ValueError: if the value does not fit in 15 bits.
+        """
+        if value > Code.MAX_CONSTANT:
+            raise ValueError(f"value out of range: @{symbol} is {value}")
+        return value
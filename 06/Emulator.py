@@ -0,0 +1,548 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import hashlib
+import os
+import struct
+import sys
+import time
+import typing
+import zlib
+from array import array
+
+RAM_SIZE = 32 * 1024
+WORD_MASK = 0xFFFF
+# Jumps may go to any address A holds.
+ADDRESS_SPACE_SIZE = WORD_MASK + 1
+MAX_BLOCK_LENGTH = 64
+SIGN_BIT = 0x8000
+ADDRESS_MASK = 0x7FFF
+# "0;JMP", which together with "@p" at address p makes the usual halting loop.
+INFINITE_LOOP_JUMP = 0b1110101010000111
+BINARY_EXTENSION = ".bin"
+# A snapshot is this header, holding the magic, the version, the SHA-256 of
+# the ROM, A, D, PC, the number of cycles and whether the computer halted,
+# followed by the zlib-compressed RAM as little-endian 16-bit words.
+SNAPSHOT_MAGIC = b"HACKSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sB32sHHHQ?")
+
+# Python expressions for the comp part of the regular C-instructions, keyed by
+# the "a c1 c2 c3 c4 c5 c6" bits. The values are unsigned 16-bit integers.
+COMP_EXPRESSIONS = {
+    "0101010": "0",
+    "0111111": "1",
+    "0111010": "0xFFFF",
+    "0001100": "d",
+    "0110000": "a",
+    "1110000": "m",
+    "0001101": "d ^ 0xFFFF",
+    "0110001": "a ^ 0xFFFF",
+    "1110001": "m ^ 0xFFFF",
+    "0001111": "-d & 0xFFFF",
+    "0110011": "-a & 0xFFFF",
+    "1110011": "-m & 0xFFFF",
+    "0011111": "(d + 1) & 0xFFFF",
+    "0110111": "(a + 1) & 0xFFFF",
+    "1110111": "(m + 1) & 0xFFFF",
+    "0001110": "(d - 1) & 0xFFFF",
+    "0110010": "(a - 1) & 0xFFFF",
+    "1110010": "(m - 1) & 0xFFFF",
+    "0000010": "(d + a) & 0xFFFF",
+    "1000010": "(d + m) & 0xFFFF",
+    "0010011": "(d - a) & 0xFFFF",
+    "1010011": "(d - m) & 0xFFFF",
+    "0000111": "(a - d) & 0xFFFF",
+    "1000111": "(m - d) & 0xFFFF",
+    "0000000": "d & a",
+    "1000000": "d & m",
+    "0010101": "d | a",
+    "1010101": "d | m"
+}
+
+# The value of a comp result for which each jump is taken.
+JUMP_CONDITIONS = {
+    1: "0 < out < 0x8000",
+    2: "out == 0",
+    3: "out < 0x8000",
+    4: "out >= 0x8000",
+    5: "out != 0",
+    6: "out == 0 or out >= 0x8000"
+}
+
+
+def alu_expression(bits: str) -> str:
+    """
+    Args:
+        bits (str): the "a c1 c2 c3 c4 c5 c6" bits of a regular C-instruction.
+
+    Returns:
+        str: a Python expression computing the ALU's output from d, a and m.
+    """
+    if bits in COMP_EXPRESSIONS:
+        return COMP_EXPRESSIONS[bits]
+    # Any other combination is computed exactly like the ALU does.
+    y = "m" if bits[0] == "1" else "a"
+    zx, nx, zy, ny, f, no = (bit == "1" for bit in bits[1:])
+    x = "0" if zx else "d"
+    x = f"(~{x})" if nx else x
+    y = "0" if zy else y
+    y = f"(~{y})" if ny else y
+    out = f"({x} + {y})" if f else f"({x} & {y})"
+    out = f"(~{out})" if no else out
+    return f"{out} & 0xFFFF"
+
+
+def shift_expression(bits: str) -> str:
+    """
+    Args:
+        bits (str): the "a c1 c2 c3 c4 c5 c6" bits of an extended CpuMul
+            instruction.
+
+    Returns:
+        str: a Python expression computing the shifted value from d, a and m.
+    """
+    operand = "d" if bits[2] == "1" else ("m" if bits[0] == "1" else "a")
+    if bits[1] == "1":
+        return f"({operand} << 1) & 0xFFFF"
+    # ">>" is an arithmetic shift, which keeps the sign bit.
+    return f"({operand} >> 1) | ({operand} & 0x8000)"
+
+
+def is_jump(word: int) -> bool:
+    return bool(word & SIGN_BIT) and bool(word & 0b111)
+
+
+def instruction_lines(word: int, nextAddress: str, last: bool) -> typing.List[str]:
+    """Generates the Python statements which execute a single instruction,
+    with the A and D registers in the local variables a and d.
+
+    Args:
+        word (int): a machine word.
+        nextAddress (str): an expression for the address which follows the
+            instruction.
+        last (bool): if this is True, the statements end by returning the new
+            A and D registers and the address of the next instruction.
+            Otherwise they update a and d, and the instruction must not be a
+            jump.
+
+    Returns:
+        typing.List[str]: the statements.
+    """
+    if not word & SIGN_BIT:
+        return [f"return {word}, d, {nextAddress}" if last else f"a = {word}"]
+    bits = f"{word:016b}"
+    compBits = bits[3:10]
+    if bits[1] == "0":
+        expression = shift_expression(compBits)
+    else:
+        expression = alu_expression(compBits)
+    destA, destD, destM = (bit == "1" for bit in bits[10:13])
+    jump = word & 0b111
+    lines = []
+    if "m" in expression:
+        lines.append("m = ram[a & 0x7FFF]")
+    lines.append(f"out = {expression}")
+    if destM:
+        lines.append("ram[a & 0x7FFF] = out")
+    if not last:
+        if destA or destD:
+            lines.append(" = ".join(
+                [register for register, isDest in (("a", destA), ("d", destD))
+                 if isDest] + ["out"]))
+        return lines
+    # The jump goes to the address A held before the instruction.
+    if jump == 0:
+        target = nextAddress
+    elif jump == 7:
+        target = "a"
+    else:
+        target = f"a if {JUMP_CONDITIONS[jump]} else {nextAddress}"
+    lines.append(f"return {'out' if destA else 'a'}, {'out' if destD else 'd'}, {target}")
+    return lines
+
+
+def handler_source(word: int) -> str:
+    """Generates the source of a factory for the handlers of a single
+    machine word. The factory takes the address which follows the instruction
+    and the RAM, and returns a handler, which takes the A and D registers and
+    returns the new A and D registers and the address of the next instruction.
+
+    Args:
+        word (int): a machine word.
+
+    Returns:
+        str: the source of the factory, named "factory".
+    """
+    return (
+        "def factory(nxt, ram):\n"
+        "    def handler(a, d):\n"
+        + "".join(f"        {line}\n"
+                  for line in instruction_lines(word, "nxt", True))
+        + "    return handler\n"
+    )
+
+
+def block_source(words: typing.Sequence[int], start: int) -> str:
+    """Generates the source of a factory for the handler of a basic block:
+    instructions which are executed one after the other, of which only the
+    last one may be a jump. The handler behaves like the handler of a single
+    instruction, see handler_source, and the factory only takes the RAM.
+
+    Args:
+        words (typing.Sequence[int]): the machine words of the block.
+        start (int): the ROM address of the first instruction of the block.
+
+    Returns:
+        str: the source of the factory, named "factory".
+    """
+    lines = []
+    for offset, word in enumerate(words):
+        lines.extend(instruction_lines(
+            word, str(start + len(words)), offset == len(words) - 1))
+    return (
+        "def factory(ram):\n"
+        "    def block(a, d):\n"
+        + "".join(f"        {line}\n" for line in lines)
+        + "    return block\n"
+    )
+
+
+def stop_handler(a: int, d: int) -> typing.Tuple[int, int, int]:
+    return a, d, -1
+
+
+def load_words(input_path: str) -> array:
+    """Reads a program written by the assembler.
+
+    Args:
+        input_path (str): path of a ".hack" text file, or of a packed ".bin"
+            file of little-endian 16-bit words.
+
+    Returns:
+        array: the machine words of the program.
+    """
+    words = array('H')
+    if os.path.splitext(input_path)[1].lower() == BINARY_EXTENSION:
+        with open(input_path, 'rb') as input_file:
+            words.frombytes(input_file.read())
+        if sys.byteorder == "big":
+            words.byteswap()
+    else:
+        with open(input_path, 'r') as input_file:
+            words.extend(int(line, 2) for line in input_file if line.strip())
+    return words
+
+
+def rom_digest(words: typing.Iterable[int]) -> bytes:
+    romBytes = array('H', words)
+    if sys.byteorder == "big":
+        romBytes.byteswap()
+    return hashlib.sha256(romBytes.tobytes()).digest()
+
+
+def read_snapshot(input_file: typing.BinaryIO, words: typing.Iterable[int]
+                  ) -> typing.Tuple[typing.Tuple[int, int, int, int, bool], array]:
+    """Reads a snapshot written by Emulator.save_snapshot.
+
+    Args:
+        input_file (typing.BinaryIO): the snapshot file.
+        words (typing.Iterable[int]): the machine words of the program the
+            snapshot is restored into.
+
+    Returns:
+        typing.Tuple[typing.Tuple[int, int, int, int, bool], array]: A, D,
+        PC, the number of cycles and whether the computer halted, and the
+        RAM.
+
+    Raises:
+        ValueError: if the file is not a snapshot, is corrupt, or was taken
+            while running another program.
+    """
+    header = input_file.read(SNAPSHOT_HEADER.size)
+    if len(header) != SNAPSHOT_HEADER.size:
+        raise ValueError("invalid snapshot: truncated header")
+    magic, version, digest, *registers = SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("invalid snapshot: unknown format")
+    if digest != rom_digest(words):
+        raise ValueError("invalid snapshot: taken while running another program")
+    try:
+        data = zlib.decompress(input_file.read())
+    except zlib.error:
+        raise ValueError("invalid snapshot: corrupt RAM")
+    ram = array('H')
+    ram.frombytes(data)
+    if len(ram) != RAM_SIZE:
+        raise ValueError("invalid snapshot: wrong RAM size")
+    if sys.byteorder == "big":
+        ram.byteswap()
+    return tuple(registers), ram
+
+
+class Emulator:
+    """A headless Hack computer, with the CpuMul shift instructions. The ROM
+    and the 32K RAM are arrays of unsigned 16-bit words. Every instruction of
+    the ROM is decoded once into a handler, a small generated function which
+    executes it, and the fetch-decode-execute loop only calls the handler of
+    the current address. Identical machine words share the generated code.
+    run() goes further, and executes whole basic blocks: the first time an
+    address is reached, the instructions from it up to the next jump are
+    compiled into a single generated function. Since jump targets are only
+    known at run time, blocks are found lazily, and may overlap.
+    The program halts when it leaves the ROM, or reaches the usual halting
+    loop, "@p" at address p followed by "0;JMP".
+    """
+
+    # The handler factory of every machine word seen so far.
+    factories = {}
+
+    def __init__(self, words: typing.Iterable[int]) -> None:
+        """Loads a program, and resets the computer.
+
+        Args:
+            words (typing.Iterable[int]): the machine words of the program.
+        """
+        self.rom = array('H', words)
+        self.ram = array('H', bytes(2 * RAM_SIZE))
+        self.handlers = [self.handler(address) for address in range(len(self.rom))]
+        self.handlers.extend(
+            [stop_handler] * (max(ADDRESS_SPACE_SIZE, len(self.rom) + 1) - len(self.rom)))
+        # The compiled block starting at every address, and its length, or
+        # None if the address was not reached yet.
+        self.blocks = [None] * len(self.handlers)
+        self.blockLengths = [0] * len(self.handlers)
+        self.reset()
+
+    @classmethod
+    def load(cls, input_path: str) -> "Emulator":
+        return cls(load_words(input_path))
+
+    def handler(self, address: int) -> typing.Callable:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            typing.Callable: the handler of the instruction at the address.
+        """
+        word = self.rom[address]
+        if self.is_halting_loop(address):
+            return stop_handler
+        factory = Emulator.factories.get(word)
+        if factory is None:
+            namespace = {}
+            exec(handler_source(word), namespace)
+            factory = Emulator.factories[word] = namespace["factory"]
+        return factory(address + 1, self.ram)
+
+    def is_halting_loop(self, address: int) -> bool:
+        return self.rom[address] == address and address + 1 < len(self.rom) \
+            and self.rom[address + 1] == INFINITE_LOOP_JUMP
+
+    def compile_block(self, start: int) -> typing.Callable:
+        """Compiles the basic block which starts at the given address. The
+        block ends after the first jump, before a halting loop, at the end of
+        the ROM, or after MAX_BLOCK_LENGTH instructions.
+
+        Args:
+            start (int): a ROM address.
+
+        Returns:
+            typing.Callable: the handler of the block.
+        """
+        end = start
+        while end < len(self.rom) and end - start < MAX_BLOCK_LENGTH \
+                and not self.is_halting_loop(end):
+            end += 1
+            if is_jump(self.rom[end - 1]):
+                break
+        if end == start:
+            block = stop_handler
+        else:
+            namespace = {}
+            exec(block_source(self.rom[start:end], start), namespace)
+            block = namespace["factory"](self.ram)
+        self.blocks[start] = block
+        self.blockLengths[start] = end - start
+        return block
+
+    def reset(self) -> None:
+        """Sets the registers and the program counter to 0. The RAM is kept."""
+        self.a = self.d = self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def save_snapshot(self, output_file: typing.BinaryIO) -> None:
+        """Writes the RAM, the registers and the program counter, so that a
+        run can later continue from this point, see restore_snapshot.
+
+        Args:
+            output_file (typing.BinaryIO): writes all output to this file.
+        """
+        output_file.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, rom_digest(self.rom),
+            self.a, self.d, self.pc, self.cycles, self.halted))
+        ram = array('H', self.ram)
+        if sys.byteorder == "big":
+            ram.byteswap()
+        output_file.write(zlib.compress(ram.tobytes()))
+
+    def restore_snapshot(self, input_file: typing.BinaryIO) -> None:
+        """Restores the state saved by save_snapshot. The compiled handlers
+        and blocks are kept.
+
+        Args:
+            input_file (typing.BinaryIO): the snapshot file.
+
+        Raises:
+            ValueError: see read_snapshot.
+        """
+        registers, ram = read_snapshot(input_file, self.rom)
+        self.a, self.d, self.pc, self.cycles, self.halted = registers
+        # The handlers refer to the RAM, so it is updated in place.
+        self.ram[:] = ram
+
+    def read(self, address: int) -> int:
+        """
+        Args:
+            address (int): a RAM address.
+
+        Returns:
+            int: the signed value at the address.
+        """
+        value = self.ram[address]
+        return value - 0x10000 if value & SIGN_BIT else value
+
+    def write(self, address: int, value: int) -> None:
+        """
+        Args:
+            address (int): a RAM address.
+            value (int): a signed or unsigned 16-bit value.
+        """
+        self.ram[address] = value & WORD_MASK
+
+    def run(self, max_cycles: int,
+            hook: typing.Optional[typing.Callable[[int, int, int], None]] = None
+            ) -> int:
+        """Executes basic blocks until the program halts, or until the next
+        block would exceed max_cycles instructions. The remaining instructions
+        are executed one at a time.
+
+        Args:
+            max_cycles (int): the maximal number of instructions to execute.
+            hook (typing.Optional[typing.Callable[[int, int, int], None]]): if
+                given, it is called after every executed block or single
+                instruction with its address, its number of instructions and
+                the address of the next instruction.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        blocks, blockLengths = self.blocks, self.blockLengths
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        while not self.halted:
+            block = blocks[pc]
+            if block is None:
+                block = self.compile_block(pc)
+            length = blockLengths[pc]
+            if executed + length > max_cycles:
+                break
+            a, d, nextPc = block(a, d)
+            if nextPc < 0:
+                self.halted = True
+                break
+            executed += length
+            if hook is not None:
+                hook(pc, length, nextPc)
+            pc = nextPc
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed + self.run_instructions(max_cycles - executed, hook)
+
+    def run_instructions(
+            self, max_cycles: int,
+            hook: typing.Optional[typing.Callable[[int, int, int], None]] = None
+            ) -> int:
+        """Executes instructions one at a time until the program halts, or
+        max_cycles instructions were executed.
+
+        Args:
+            max_cycles (int): the maximal number of instructions to execute.
+            hook (typing.Optional[typing.Callable[[int, int, int], None]]): see
+                run.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        handlers = self.handlers
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        if not self.halted:
+            for executed in range(1, max_cycles + 1):
+                a, d, nextPc = handlers[pc](a, d)
+                if nextPc < 0:
+                    # The stopping instruction is not executed.
+                    executed -= 1
+                    self.halted = True
+                    break
+                if hook is not None:
+                    hook(pc, 1, nextPc)
+                pc = nextPc
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+
+if "__main__" == __name__:
+    # Runs a ".hack" or ".bin" program until it halts, and prints the number
+    # of instructions executed, the speed of the emulator and the values of
+    # the requested RAM addresses. With --single-step, the instructions are
+    # executed one at a time instead of in basic blocks. With --restore, the
+    # run continues from a snapshot, and with --save, a snapshot is written
+    # after running, e.g. to skip the operating system's initialization.
+    argument_parser = argparse.ArgumentParser(prog="Emulator")
+    argument_parser.add_argument("input_path")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=10 ** 7, metavar="N",
+        help="the maximal number of instructions to execute")
+    argument_parser.add_argument(
+        "--set", nargs=2, type=int, action="append", default=[],
+        metavar=("ADDRESS", "VALUE"), help="set a RAM address before running")
+    argument_parser.add_argument(
+        "--ram", type=int, nargs="*", default=[], metavar="ADDRESS",
+        help="RAM addresses to print after running")
+    argument_parser.add_argument(
+        "--single-step", action="store_true",
+        help="execute one instruction at a time instead of basic blocks")
+    argument_parser.add_argument(
+        "--restore", metavar="PATH", help="start from a snapshot")
+    argument_parser.add_argument(
+        "--save", metavar="PATH", help="write a snapshot after running")
+    arguments = argument_parser.parse_args()
+    emulator = Emulator.load(arguments.input_path)
+    if arguments.restore is not None:
+        with open(arguments.restore, 'rb') as snapshot_file:
+            emulator.restore_snapshot(snapshot_file)
+    for address, value in arguments.set:
+        emulator.write(address, value)
+    start = time.perf_counter()
+    if arguments.single_step:
+        executed = emulator.run_instructions(arguments.cycles)
+    else:
+        executed = emulator.run(arguments.cycles)
+    elapsed = time.perf_counter() - start
+    print(f"{executed} instructions in {elapsed:.3f}s "
+          f"({executed / max(elapsed, 1e-9) / 1e6:.2f}M/s), "
+          f"{'halted' if emulator.halted else 'stopped'} at {emulator.pc}")
+    for address in arguments.ram:
+        print(f"RAM[{address}] = {emulator.read(address)}")
+    if arguments.save is not None:
+        with open(arguments.save, 'wb') as snapshot_file:
+            emulator.save_snapshot(snapshot_file)
@@ -5,55 +5,221 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import functools
+import json
 import os
 import sys
+import time
 import typing
+from concurrent.futures import ProcessPoolExecutor
+from array import array
 from SymbolTable import SymbolTable
-from Parser import Parser
+from Parser import Parser, Instruction
 from Code import Code
+from AssemblyCache import AssemblyCache, DEFAULT_MAX_CACHE_SIZE
 
 REGISTER_BIT_COUNT = 16
+OUTPUT_CHUNK_SIZE = 4096
+TEXT_EXTENSION = ".hack"
+BINARY_EXTENSION = ".bin"
+SYMBOLS_EXTENSION = ".sym.json"
+LISTING_EXTENSION = ".lst"
 
-def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
-    """Assembles a single file.
+
+def write_words(words: array, output_file: typing.TextIO) -> None:
+    """Writes the assembled machine words as text, one word per line, in
+    chunks of OUTPUT_CHUNK_SIZE lines, so the whole text of the program is
+    never held in memory at once.
 
     Args:
-        input_file (typing.TextIO): the file to assemble.
+        words (array): the assembled machine words.
         output_file (typing.TextIO): writes all output to this file.
     """
+    for chunkStart in range(0, len(words), OUTPUT_CHUNK_SIZE):
+        if chunkStart > 0:
+            output_file.write("\n")
+        output_file.write("\n".join(
+            f"{word:0{REGISTER_BIT_COUNT}b}"
+            for word in words[chunkStart:chunkStart + OUTPUT_CHUNK_SIZE]))
+
+
+def write_binary_words(words: array, output_file: typing.BinaryIO) -> None:
+    """Writes the assembled machine words as a packed array of little-endian
+    unsigned 16-bit integers, in a single write.
+
+    Args:
+        words (array): the assembled machine words.
+        output_file (typing.BinaryIO): writes all output to this file.
+    """
+    binaryWords = array('H', words)
+    if sys.byteorder == "big":
+        binaryWords.byteswap()
+    output_file.write(memoryview(binaryWords))
+
+
+def write_listing(
+        lines: typing.List[str], instructions: typing.List[Instruction],
+        words: array, output_file: typing.TextIO) -> None:
+    """Writes an address-annotated listing of the program. Every line holds
+    the ROM address, the machine word and the command, separated by tabs.
+    Label lines have no machine word, and hold the address of the next
+    instruction.
+
+    Args:
+        lines (typing.List[str]): the commands of the program.
+        instructions (typing.List[Instruction]): the decoded commands.
+        words (array): the machine words of the program.
+        output_file (typing.TextIO): writes all output to this file.
+    """
+    address = 0
+    for line, instruction in zip(lines, instructions):
+        if instruction.command_type == "L_COMMAND":
+            output_file.write(f"{address}\t\t{line}\n")
+        else:
+            output_file.write(
+                f"{address}\t{words[address]:0{REGISTER_BIT_COUNT}b}\t{line}\n")
+            address += 1
+
+
+def assemble(
+        input_file: typing.TextIO,
+        listing_file: typing.Optional[typing.TextIO] = None
+        ) -> typing.Tuple[array, SymbolTable]:
+    """Assembles a single file into machine words.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        listing_file (typing.Optional[typing.TextIO]): if given, an
+            address-annotated listing of the program is written to it.
+
+    Returns:
+        typing.Tuple[array, SymbolTable]: the machine words of the assembled
+        program, and its symbol table with all symbols resolved.
+
+    Raises:
+        ValueError: if the value of an A-instruction does not fit in 15 bits.
+    """
     # Your code goes here!
     # A good place to start is to initialize a new Parser object:
     parser = Parser(input_file)
     symbolTable = SymbolTable()
-    LCommandsFound = 0
-    while (parser.has_more_commands()):
-        if (parser.command_type() == "L_COMMAND"):
-            symbolTable.add_entry(parser.symbol(), parser.currentLineIndex - LCommandsFound)
-            LCommandsFound += 1
-        parser.advance()
-    
     symbolIndex = SymbolTable.NAMED_VARIABLE_MIN_ADDRESS
-    outputText = ""
-    parser.reset()
-
-    while (parser.has_more_commands()):
-        if (parser.command_type() == "C_COMMAND"):
-            outputText += f"111{Code.comp(parser.comp())}{Code.dest(parser.dest())}{Code.jump(parser.jump())}\n"
-        elif (parser.command_type() == "A_COMMAND"):
-            symbol = parser.symbol()
+    # The file is assembled in a single pass: labels are added to the symbol
+    # table as soon as they are seen, and references to symbols which are not
+    # yet known (either forward label references or variables) are left as
+    # placeholders and backpatched once the whole file has been read.
+    # The program is kept as an array of machine words rather than text.
+    words = array('H')
+    unresolved = []
+
+    for instruction in parser.instructions:
+        if (instruction.command_type == "C_COMMAND"):
+            words.append(Code.c_instruction(instruction.dest, instruction.comp, instruction.jump))
+        elif (instruction.command_type == "A_COMMAND"):
+            symbol = instruction.symbol
             if symbol.isdecimal():
-                symbol = int(symbol)
-            elif not symbolTable.contains(symbol):
-                symbolTable.add_entry(parser.symbol(), symbolIndex)
-                symbolIndex += 1
-                symbol = symbolTable.get_address(parser.symbol())
+                words.append(Code.a_instruction(symbol, int(symbol)))
+            elif symbolTable.contains(symbol):
+                words.append(Code.a_instruction(symbol, symbolTable.get_address(symbol)))
+            else:
+                unresolved.append((len(words), symbol))
+                words.append(0)
+        else:
+            symbolTable.add_label(instruction.symbol, len(words))
+
+    # Symbols that are still unknown after the whole file was read are
+    # variables, allocated in order of first appearance.
+    for wordIndex, symbol in unresolved:
+        if not symbolTable.contains(symbol):
+            symbolTable.add_entry(symbol, symbolIndex)
+            symbolIndex += 1
+        words[wordIndex] = Code.a_instruction(symbol, symbolTable.get_address(symbol))
+
+    if listing_file is not None:
+        write_listing(parser.input_lines, parser.instructions, words, listing_file)
+    return words, symbolTable
+
+
+def assemble_file(
+        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+    """Assembles a single file.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.TextIO): writes all output to this file.
+    """
+    words, _ = assemble(input_file)
+    write_words(words, output_file)
+
+
+def assemble_file_binary(
+        input_file: typing.TextIO, output_file: typing.BinaryIO) -> None:
+    """Assembles a single file into the packed binary format.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.BinaryIO): writes all output to this file.
+    """
+    words, _ = assemble(input_file)
+    write_binary_words(words, output_file)
+
+
+def assemble_path(
+        input_path: str, binary: bool,
+        cache_directory: typing.Optional[str] = None,
+        symbols: bool = False, listing: bool = False) -> typing.Tuple[float, bool]:
+    """Assembles a single .asm file into the matching output file. If a cache
+    directory is given, unchanged files are taken from the cache instead of
+    being assembled again.
+
+    Args:
+        input_path (str): path of the .asm file to assemble.
+        binary (bool): if this is True, the packed binary format is written
+            instead of the text format.
+        cache_directory (typing.Optional[str]): the AssemblyCache directory,
+            or None to always assemble the file.
+        symbols (bool): if this is True, the symbol map of the program is
+            written to a .sym.json file.
+        listing (bool): if this is True, an address-annotated listing of the
+            program is written to a .lst file. The listing needs the source,
+            so the file is always assembled.
+
+    Returns:
+        typing.Tuple[float, bool]: the time it took to assemble the file, in
+        seconds, and whether it was found in the cache.
+    """
+    startTime = time.perf_counter()
+    filename, _ = os.path.splitext(input_path)
+    cached = None
+    if cache_directory is not None:
+        cache = AssemblyCache(cache_directory)
+        key = AssemblyCache.key(input_path)
+        if not listing:
+            cached = cache.load(key)
+    if cached is not None:
+        words, symbolMap = cached
+    else:
+        with open(input_path, 'r') as input_file:
+            if listing:
+                with open(filename + LISTING_EXTENSION, 'w') as listing_file:
+                    words, symbolTable = assemble(input_file, listing_file)
             else:
-                symbol = symbolTable.get_address(parser.symbol())
-            outputText += f"{(bin(symbol)[2:]).zfill(REGISTER_BIT_COUNT)}\n"
-        parser.advance()
-    
-    output_file.write(outputText.strip())
+                words, symbolTable = assemble(input_file)
+        symbolMap = symbolTable.symbol_map()
+        if cache_directory is not None:
+            cache.store(key, words, symbolMap)
+
+    if binary:
+        with open(filename + BINARY_EXTENSION, 'wb') as output_file:
+            write_binary_words(words, output_file)
+    else:
+        with open(filename + TEXT_EXTENSION, 'w') as output_file:
+            write_words(words, output_file)
+    if symbols:
+        with open(filename + SYMBOLS_EXTENSION, 'w') as symbols_file:
+            json.dump(symbolMap, symbols_file, separators=(",", ":"))
+    return time.perf_counter() - startTime, cached is not None
 
 
 if "__main__" == __name__:
@@ -62,20 +228,65 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    # The --binary flag writes a packed ".bin" file instead of the text
+    # ".hack" file. With --jobs, the files are assembled on a pool of that
+    # many processes (every file has its own SymbolTable, so they are
+    # independent), and the time taken by each file is reported. With
+    # --cache, unchanged files are taken from an AssemblyCache in the given
+    # directory, and the cache's usage is reported. --symbols and --listing
+    # also write the symbol map and an address-annotated listing of every
+    # file.
+    argument_parser = argparse.ArgumentParser(prog="Assembler")
+    argument_parser.add_argument("input_path")
+    argument_parser.add_argument(
+        "--binary", action="store_true",
+        help="write little-endian 16-bit words to a .bin file")
+    argument_parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="assemble files on N processes and report per-file timings")
+    argument_parser.add_argument(
+        "--cache", metavar="DIR",
+        help="reuse the output of unchanged files from a cache directory")
+    argument_parser.add_argument(
+        "--cache-size", type=int, default=DEFAULT_MAX_CACHE_SIZE,
+        metavar="BYTES", help="the maximal size of the cache directory")
+    argument_parser.add_argument(
+        "--symbols", action="store_true",
+        help="write the labels and variables of each file to a .sym.json file")
+    argument_parser.add_argument(
+        "--listing", action="store_true",
+        help="write an address-annotated listing of each file to a .lst file")
+    arguments = argument_parser.parse_args()
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == ".asm"]
+    count = len(files_to_assemble)
+    assemble_input_path = functools.partial(
+        assemble_path, binary=arguments.binary,
+        cache_directory=arguments.cache, symbols=arguments.symbols,
+        listing=arguments.listing)
+    if arguments.jobs is None:
+        results = [
+            assemble_input_path(input_path) for input_path in files_to_assemble]
+    else:
+        if arguments.jobs < 1:
+            argument_parser.error("--jobs must be at least 1")
+        with ProcessPoolExecutor(max_workers=arguments.jobs) as executor:
+            results = list(executor.map(assemble_input_path, files_to_assemble))
+            for input_path, (elapsed, _) in zip(files_to_assemble, results):
+                print(f"{os.path.basename(input_path)}: {elapsed:.3f}s")
+    if arguments.cache is not None:
+        # Every file is looked up in its own process, so the totals are
+        # gathered here.
+        cache = AssemblyCache(arguments.cache, arguments.cache_size)
+        cache.hits = sum(cacheHit for _, cacheHit in results)
+        cache.misses = count - cache.hits
+        cache.evict()
+        print(cache.stats())
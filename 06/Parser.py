@@ -5,10 +5,83 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import io
+import mmap
 import typing
 import re
 
 C_COMMAND_PATTERN = re.compile(r"^(?:(.*)=)?([^=;]*)(?:;(.*))?$")
+CLEANED_LINES_CACHE_SIZE = 4096
+
+
+class Instruction:
+    """A single decoded assembly command. Every line of the input is decoded
+    exactly once into an Instruction, so the fields can be read any number of
+    times without parsing the line again. Identical lines share the same
+    Instruction, so it should not be modified.
+    """
+    __slots__ = ("command_type", "symbol", "dest", "comp", "jump")
+
+    def __init__(self, line: str) -> None:
+        """Decodes a single command line.
+
+        Args:
+            line (str): a command line, without comments and white space.
+        """
+        self.symbol = self.dest = self.comp = self.jump = None
+        if (line.startswith('(')):
+            self.command_type = "L_COMMAND"
+            self.symbol = line[1:-1]
+        elif (line.startswith('@')):
+            self.command_type = "A_COMMAND"
+            self.symbol = line[1:]
+        else:
+            self.command_type = "C_COMMAND"
+            self.dest, self.comp, self.jump = C_COMMAND_PATTERN.match(line).groups()
+
+
+def read_commands(input_file: typing.TextIO) -> typing.Iterator[str]:
+    """Lazily reads the commands of the input file, one line at a time, with
+    all comments and white space removed and empty lines skipped. A real file
+    is memory-mapped instead of being read into memory.
+
+    Args:
+        input_file (typing.TextIO): input file.
+
+    Returns:
+        typing.Iterator[str]: the commands of the input file.
+    """
+    try:
+        mappedFile = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, io.UnsupportedOperation, ValueError, OSError):
+        # Not a real file (e.g. io.StringIO), or an empty one, which cannot be
+        # mapped.
+        mappedFile = None
+    if mappedFile is None:
+        for line in input_file:
+            command = "".join(line.split("//")[0].split())
+            if command != '':
+                yield command
+        return
+    # Generated assembly repeats the same raw lines over and over, so recently
+    # seen raw lines are cleaned and decoded only once. The cache is cleared
+    # whenever it fills up, to keep memory bounded on files with many
+    # distinct lines.
+    encoding = getattr(input_file, "encoding", None) or "utf-8"
+    cleanedLines = {}
+    try:
+        for line in iter(mappedFile.readline, b""):
+            command = cleanedLines.get(line)
+            if command is None:
+                if len(cleanedLines) >= CLEANED_LINES_CACHE_SIZE:
+                    cleanedLines.clear()
+                command = cleanedLines[line] = "".join(
+                    line.decode(encoding).split("//")[0].split())
+            if command != '':
+                yield command
+    finally:
+        mappedFile.close()
+
 
 class Parser:
     """Encapsulates access to the input code. Reads an assembly program
@@ -23,19 +96,20 @@ class Parser:
         Args:
             input_file (typing.TextIO): input file.
         """
-        # Your code goes here!
-        # A good place to start is to read all the lines of the input:
-        self.input_lines = input_file.read().splitlines()
-        self.delete_comments_and_empty()
-        
-        self.currentLineIndex = 0
-        if (self.has_more_commands()):
-            self.currentLine = self.input_lines[self.currentLineIndex]
-    
-    def delete_comments_and_empty(self) -> None:
-        self.input_lines = [x.split("//")[0].strip() for x in self.input_lines]
-        self.input_lines = [x for x in self.input_lines if x != '']
+        # Generated assembly repeats a small number of distinct lines over and
+        # over, so each distinct line is decoded (and stored) only once.
+        decodedLines = {}
+        self.input_lines = []
+        self.instructions = []
+        for line in read_commands(input_file):
+            decoded = decodedLines.get(line)
+            if decoded is None:
+                decoded = decodedLines[line] = (line, Instruction(line))
+            self.input_lines.append(decoded[0])
+            self.instructions.append(decoded[1])
 
+        self.reset()
+    
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
 
@@ -51,11 +125,13 @@ class Parser:
         self.currentLineIndex += 1
         if (self.has_more_commands()):
             self.currentLine = self.input_lines[self.currentLineIndex]
+            self.currentInstruction = self.instructions[self.currentLineIndex]
 
     def reset(self) -> None:
         self.currentLineIndex = 0
         if (self.has_more_commands()):
             self.currentLine = self.input_lines[self.currentLineIndex]
+            self.currentInstruction = self.instructions[self.currentLineIndex]
 
     def command_type(self) -> str:
         """
@@ -65,12 +141,7 @@ class Parser:
             "C_COMMAND" for dest=comp;jump
             "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a symbol
         """
-        if (self.currentLine.startswith('(')):
-            return "L_COMMAND"
-        elif (self.currentLine.startswith('@')):
-            return "A_COMMAND"
-        else:
-            return "C_COMMAND"
+        return self.currentInstruction.command_type
 
     def symbol(self) -> str:
         """
@@ -79,7 +150,7 @@ class Parser:
             (Xxx). Should be called only when command_type() is "A_COMMAND" or 
             "L_COMMAND".
         """
-        return self.currentLine[1:] if self.command_type() == "A_COMMAND" else self.currentLine[1:-1]
+        return self.currentInstruction.symbol
 
     def dest(self) -> str:
         """
@@ -87,7 +158,7 @@ class Parser:
             str: the dest mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        return C_COMMAND_PATTERN.match(self.currentLine).group(1)
+        return self.currentInstruction.dest
 
     def comp(self) -> str:
         """
@@ -95,7 +166,7 @@ class Parser:
             str: the comp mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        return C_COMMAND_PATTERN.match(self.currentLine).group(2)
+        return self.currentInstruction.comp
 
     def jump(self) -> str:
         """
@@ -103,4 +174,4 @@ class Parser:
             str: the jump mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        return C_COMMAND_PATTERN.match(self.currentLine).group(3)
+        return self.currentInstruction.jump
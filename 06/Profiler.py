@@ -0,0 +1,284 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import json
+import os
+import typing
+from Emulator import Emulator, SIGN_BIT, is_jump
+
+SYMBOLS_EXTENSION = ".sym.json"
+ROOT_NAME = "(bootstrap)"
+# The VM translator names its labels "function$label", and the return address
+# of a call "function$ret.n".
+LOCAL_LABEL_SEPARATOR = "$"
+RETURN_LABEL_MARKER = "$ret."
+# The kinds of jumps, as flags: a jump which may call a function, and a jump
+# which may return from one.
+CALL_JUMP = 1
+RETURN_JUMP = 2
+
+
+def is_function_label(label: str) -> bool:
+    # VM functions are named "Class.function", and their local labels are
+    # scoped by the function's name.
+    return "." in label and LOCAL_LABEL_SEPARATOR not in label
+
+
+class Profiler:
+    """Runs a program on an Emulator, counting the instructions executed at
+    every ROM address. The counts are attributed to the labels of the
+    program's symbol map (see SymbolTable.symbol_map): every instruction
+    belongs to the last label preceding it, and by default only labels which
+    are not local to a VM function ("function$label") are used, so the
+    instructions are attributed to the VM functions.
+    Calls are observed as jumps to the entry label of a VM function, either
+    from a call site, which is followed by a return address label, or from a
+    computed address, like the shared call routine. Returns are observed as
+    jumps from a computed address to a return address label. Jumps to labels
+    inside functions, which may share their address with a function's entry
+    or with a return address, are neither. The profiler keeps the resulting
+    call stack, and counts the instructions executed under every stack, for
+    a collapsed-stack flamegraph.
+    The emulator's basic blocks are reused, and only the entries to blocks are
+    counted while running, so profiling costs little more than running.
+    """
+
+    def __init__(self, emulator: Emulator,
+                 symbol_map: typing.Dict[str, typing.Dict[str, int]]) -> None:
+        """
+        Args:
+            emulator (Emulator): the emulator, with the program loaded.
+            symbol_map (typing.Dict[str, typing.Dict[str, int]]): the symbol
+                map of the program, as written by the assembler.
+        """
+        self.emulator = emulator
+        self.labels = sorted(
+            (address, label) for label, address in symbol_map["labels"].items())
+        # The function which starts at every address, and whether every
+        # address is a return address.
+        self.functions = [None] * len(emulator.handlers)
+        self.returnAddresses = [False] * len(emulator.handlers)
+        for address, label in self.labels:
+            if is_function_label(label):
+                self.functions[address] = label
+            elif RETURN_LABEL_MARKER in label:
+                self.returnAddresses[address] = True
+        # The kind of the jump at every address, or 0. The VM translator sets
+        # A right before every jump, so a jump preceded by an A-instruction
+        # goes to a constant address, while one preceded by a C-instruction
+        # (a word with the sign bit set) goes to a computed address, such as
+        # a return address or the function called by the shared call routine,
+        # and may either call or return. A jump to a constant address calls
+        # only from a call site, which is followed by a return address;
+        # otherwise it is a jump inside a function.
+        rom = emulator.rom
+        self.jumps = [0] * len(emulator.handlers)
+        for address, word in enumerate(rom):
+            if not is_jump(word):
+                continue
+            if address == 0 or rom[address - 1] & SIGN_BIT:
+                self.jumps[address] = CALL_JUMP | RETURN_JUMP
+            elif self.returnAddresses[address + 1]:
+                self.jumps[address] = CALL_JUMP
+        # The number of times every block was entered, and the number of
+        # instructions executed one at a time at every address.
+        self.blockEntries = [0] * len(emulator.handlers)
+        self.instructionCounts = [0] * len(emulator.handlers)
+        # Every call stack seen so far is a node of a tree, which holds the
+        # node of the stack without its last function, the last function and
+        # the number of instructions executed under the stack. The current
+        # stack is kept as the list of the nodes of its prefixes.
+        self.nodeParents = [None]
+        self.nodeNames = [ROOT_NAME]
+        self.nodeCycles = [0]
+        self.children = {}
+        self.stack = [0]
+
+    @classmethod
+    def load(cls, input_path: str,
+             symbols_path: typing.Optional[str] = None) -> "Profiler":
+        """
+        Args:
+            input_path (str): path of a ".hack" or ".bin" program.
+            symbols_path (typing.Optional[str]): path of the program's symbol
+                map, by default the ".sym.json" file next to the program.
+
+        Returns:
+            Profiler: a profiler for a new emulator running the program.
+        """
+        if symbols_path is None:
+            symbols_path = os.path.splitext(input_path)[0] + SYMBOLS_EXTENSION
+        with open(symbols_path, 'r') as symbols_file:
+            symbol_map = json.load(symbols_file)
+        return cls(Emulator.load(input_path), symbol_map)
+
+    def run(self, max_cycles: int) -> int:
+        """Runs the emulator with Emulator.run, while profiling it.
+
+        Args:
+            max_cycles (int): the maximal number of instructions to execute.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        blockLengths, jumps = self.emulator.blockLengths, self.jumps
+        functions, returnAddresses = self.functions, self.returnAddresses
+        blockEntries, instructionCounts = self.blockEntries, self.instructionCounts
+        stack, nodeCycles = self.stack, self.nodeCycles
+
+        def profile(pc: int, length: int, nextPc: int) -> None:
+            # Single instructions are counted as blocks when they make up a
+            # whole block.
+            if length == blockLengths[pc]:
+                blockEntries[pc] += 1
+            else:
+                instructionCounts[pc] += 1
+            nodeCycles[stack[-1]] += length
+            # Only the last instruction of a block may be a jump.
+            last = pc + length - 1
+            jump = jumps[last]
+            if jump and nextPc != last + 1:
+                if jump & CALL_JUMP and functions[nextPc] is not None:
+                    stack.append(self.child_node(stack[-1], functions[nextPc]))
+                elif jump & RETURN_JUMP and returnAddresses[nextPc] \
+                        and len(stack) > 1:
+                    stack.pop()
+
+        return self.emulator.run(max_cycles, profile)
+
+    def child_node(self, node: int, name: str) -> int:
+        """
+        Args:
+            node (int): the node of a call stack.
+            name (str): a function called from the stack.
+
+        Returns:
+            int: the node of the stack with the function called, which is
+            added if it was not seen yet.
+        """
+        child = self.children.get((node, name))
+        if child is None:
+            child = self.children[(node, name)] = len(self.nodeNames)
+            self.nodeParents.append(node)
+            self.nodeNames.append(name)
+            self.nodeCycles.append(0)
+        return child
+
+    def stack_cycles(self) -> typing.Dict[str, int]:
+        """
+        Returns:
+            typing.Dict[str, int]: the number of instructions executed under
+            every call stack, keyed by the ";"-separated names of its
+            functions, outermost first.
+        """
+        cycles = {}
+        for node, count in enumerate(self.nodeCycles):
+            if count:
+                names = []
+                while node is not None:
+                    names.append(self.nodeNames[node])
+                    node = self.nodeParents[node]
+                cycles[";".join(reversed(names))] = count
+        return cycles
+
+    def address_counts(self) -> typing.List[int]:
+        """
+        Returns:
+            typing.List[int]: the number of times the instruction at every ROM
+            address was executed.
+        """
+        counts = self.instructionCounts[:len(self.emulator.rom)]
+        blockLengths = self.emulator.blockLengths
+        for start, entries in enumerate(self.blockEntries):
+            if entries:
+                for address in range(start, start + blockLengths[start]):
+                    counts[address] += entries
+        return counts
+
+    def label_cycles(self, local_labels: bool = False) -> typing.Dict[str, int]:
+        """
+        Args:
+            local_labels (bool): if this is True, the instructions are
+                attributed to the local labels of the VM functions too.
+
+        Returns:
+            typing.Dict[str, int]: the number of instructions executed under
+            every label. Instructions which precede the first label are
+            counted under "(bootstrap)".
+        """
+        starts = {}
+        for address, label in self.labels:
+            if local_labels or LOCAL_LABEL_SEPARATOR not in label:
+                # Of several labels at the same address, a function's entry
+                # label is preferred.
+                if address not in starts or is_function_label(label):
+                    starts[address] = label
+        cycles = {}
+        label = ROOT_NAME
+        for address, count in enumerate(self.address_counts()):
+            label = starts.get(address, label)
+            if count:
+                cycles[label] = cycles.get(label, 0) + count
+        return cycles
+
+    def flat_profile(self, local_labels: bool = False) -> str:
+        """
+        Args:
+            local_labels (bool): see label_cycles.
+
+        Returns:
+            str: a human-readable report of the number and the percentage of
+            instructions executed under every label, largest first.
+        """
+        cycles = self.label_cycles(local_labels)
+        total = sum(cycles.values())
+        result = [f"{count}\t{100 * count / max(total, 1):.2f}%\t{label}"
+                  for label, count in sorted(cycles.items(), key=lambda item: -item[1])]
+        result.append(f"total: {total} instructions")
+        return "\n".join(result)
+
+    def write_collapsed_stacks(self, output_file: typing.TextIO) -> None:
+        """Writes the number of instructions executed under every observed
+        call stack, in the collapsed-stack format read by flamegraph tools:
+        a line of "root;caller;callee count" for every stack.
+
+        Args:
+            output_file (typing.TextIO): writes all output to this file.
+        """
+        for stackKey, count in sorted(self.stack_cycles().items()):
+            output_file.write(f"{stackKey} {count}\n")
+
+
+if "__main__" == __name__:
+    # Runs a ".hack" or ".bin" program until it halts, and prints its flat
+    # profile, using the ".sym.json" symbol map which the assembler writes
+    # with --symbols. With --local-labels, the instructions are attributed to
+    # the local labels of the VM functions too, such as loops. With
+    # --flamegraph, the instructions executed under every call stack are
+    # written to the given file, in the collapsed-stack format.
+    argument_parser = argparse.ArgumentParser(prog="Profiler")
+    argument_parser.add_argument("input_path")
+    argument_parser.add_argument(
+        "--symbols", metavar="PATH",
+        help="the symbol map of the program, by default its .sym.json file")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=10 ** 7, metavar="N",
+        help="the maximal number of instructions to execute")
+    argument_parser.add_argument(
+        "--local-labels", action="store_true",
+        help="attribute instructions to the labels inside VM functions too")
+    argument_parser.add_argument(
+        "--flamegraph", metavar="PATH",
+        help="write the instructions executed under every call stack")
+    arguments = argument_parser.parse_args()
+    profiler = Profiler.load(arguments.input_path, arguments.symbols)
+    profiler.run(arguments.cycles)
+    print(profiler.flat_profile(arguments.local_labels))
+    if arguments.flamegraph is not None:
+        with open(arguments.flamegraph, 'w') as output_file:
+            profiler.write_collapsed_stacks(output_file)
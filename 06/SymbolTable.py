@@ -5,6 +5,7 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import typing
 
 
 class SymbolTable:
@@ -15,36 +16,39 @@ class SymbolTable:
 
     NAMED_VARIABLE_MIN_ADDRESS = 16
 
+    PREDEFINED_SYMBOLS = {
+        "R0": 0,
+        "R1": 1,
+        "R2": 2,
+        "R3": 3,
+        "R4": 4,
+        "R5": 5,
+        "R6": 6,
+        "R7": 7,
+        "R8": 8,
+        "R9": 9,
+        "R10": 10,
+        "R11": 11,
+        "R12": 12,
+        "R13": 13,
+        "R14": 14,
+        "R15": 15,
+        "SCREEN": 16384,
+        "KBD": 24576,
+        "SP": 0,
+        "LCL": 1,
+        "ARG": 2,
+        "THIS": 3,
+        "THAT": 4
+    }
+
     def __init__(self) -> None:
         """Creates a new symbol table initialized with all the predefined symbols
         and their pre-allocated RAM addresses, according to section 6.2.3 of the
         book.
         """
-        self.symbolTable = {
-            "R0": 0,
-            "R1": 1,
-            "R2": 2,
-            "R3": 3,
-            "R4": 4,
-            "R5": 5,
-            "R6": 6,
-            "R7": 7,
-            "R8": 8,
-            "R9": 9,
-            "R10": 10,
-            "R11": 11,
-            "R12": 12,
-            "R13": 13,
-            "R14": 14,
-            "R15": 15,
-            "SCREEN": 16384,
-            "KBD": 24576,
-            "SP": 0,
-            "LCL": 1,
-            "ARG": 2,
-            "THIS": 3,
-            "THAT": 4
-        }
+        self.symbolTable = dict(SymbolTable.PREDEFINED_SYMBOLS)
+        self.labels = set()
 
     def add_entry(self, symbol: str, address: int) -> None:
         """Adds the pair (symbol, address) to the table.
@@ -76,3 +80,29 @@ class SymbolTable:
             int: the address associated with the symbol.
         """
         return self.symbolTable[symbol]
+
+    def add_label(self, symbol: str, address: int) -> None:
+        """Adds the pair (symbol, address) to the table, and marks the symbol
+        as a label (a ROM address) rather than a variable (a RAM address).
+
+        Args:
+            symbol (str): the label to add.
+            address (int): the ROM address of the label.
+        """
+        self.labels.add(symbol)
+        self.add_entry(symbol, address)
+
+    def symbol_map(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        Returns:
+            typing.Dict[str, typing.Dict[str, int]]: the symbols defined by the
+            program (without the predefined symbols), as {"labels": {label:
+            ROM address}, "variables": {variable: RAM address}}.
+        """
+        symbolMap = {"labels": {}, "variables": {}}
+        for symbol, address in self.symbolTable.items():
+            if symbol in self.labels:
+                symbolMap["labels"][symbol] = address
+            elif symbol not in SymbolTable.PREDEFINED_SYMBOLS:
+                symbolMap["variables"][symbol] = address
+        return symbolMap
@@ -0,0 +1,84 @@
+// A hand-written program in the shape of the VM translator's output, with
+// known call and return counts, for the Profiler's tests. A call pushes its
+// return address on the stack and jumps to the function, and a return pops
+// it and jumps to it.
+// Bootstrap: SP = 256, then Sys.init, as in compact mode.
+@256
+D=A
+@SP
+M=D
+@Sys.init
+0;JMP
+($ret.0)
+// The shared call routine, entered with the return address in R15 and the
+// function in R13.
+(SHARED_CALL)
+@R15
+D=M
+@SP
+M=M+1
+A=M-1
+M=D
+@R13
+A=M
+0;JMP
+// function Sys.init 0
+(Sys.init)
+// call Main.count, with 3 iterations
+@3
+D=A
+@R5
+M=D
+@Sys.init$ret.0
+D=A
+@SP
+M=M+1
+A=M-1
+M=D
+@Main.count
+0;JMP
+(Sys.init$ret.0)
+// call Main.count through the shared call routine, with 2 iterations
+@2
+D=A
+@R5
+M=D
+@Sys.init$ret.1
+D=A
+@R15
+M=D
+@Main.count
+D=A
+@R13
+M=D
+@SHARED_CALL
+0;JMP
+(Sys.init$ret.1)
+// call Sys.halt, which never returns
+@Sys.init$ret.2
+D=A
+@SP
+M=M+1
+A=M-1
+M=D
+@Sys.halt
+0;JMP
+(Sys.init$ret.2)
+// function Main.count 0, whose body starts with a loop
+(Main.count)
+(Main.count$LOOP)
+@R5
+MD=M-1
+@Main.count$LOOP
+D;JGT
+// return
+@SP
+AM=M-1
+A=M
+0;JMP
+// function Sys.halt 0, whose body starts with a loop
+(Sys.halt)
+(Sys.halt$WHILE_EXP0)
+D=0
+@Sys.halt$WHILE_EXP0
+0;JMP
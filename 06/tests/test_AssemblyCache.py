@@ -0,0 +1,49 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import pytest
+from array import array
+from AssemblyCache import AssemblyCache
+
+SYMBOLS = {"labels": {"LOOP": 2}, "variables": {"i": 16}}
+
+
+def test_store_and_load(tmp_path):
+    cache = AssemblyCache(str(tmp_path))
+    cache.store("k", array('H', [16, 0xEC10, 0xFFFF]), SYMBOLS)
+    words, symbols = cache.load("k")
+    assert list(words) == [16, 0xEC10, 0xFFFF]
+    assert symbols == SYMBOLS
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_missing_entry(tmp_path):
+    cache = AssemblyCache(str(tmp_path))
+    assert cache.load("k") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"garbage\n",
+    # Two words are announced, but only one is present.
+    b"\x02\x00\x00\x00\x10\x00",
+    b"\x01\x00\x00\x00\x10\x00{not json",
+    b"\x01\x00\x00\x00\x10\x00\xff\xfe",
+    b"\x01\x00\x00\x00\x10\x00[1, 2]",
+    b'\x01\x00\x00\x00\x10\x00{"labels": {}}',
+    b'\x01\x00\x00\x00\x10\x00{"labels": {"X": "1"}, "variables": {}}',
+    b'\x01\x00\x00\x00\x10\x00{"labels": [], "variables": {}}',
+])
+def test_corrupt_entry_is_a_miss(tmp_path, content):
+    cache = AssemblyCache(str(tmp_path))
+    with open(cache.entry_path("k"), 'wb') as entry_file:
+        entry_file.write(content)
+    assert cache.load("k") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert not os.path.exists(cache.entry_path("k"))
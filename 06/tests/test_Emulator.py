@@ -0,0 +1,69 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import os
+import pytest
+from Emulator import Emulator, SNAPSHOT_HEADER
+from Main import assemble
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_emulator() -> Emulator:
+    with open(os.path.join(FIXTURES, "ProfileCalls.asm"), 'r') as input_file:
+        words, _ = assemble(input_file)
+    return Emulator(words)
+
+
+@pytest.mark.parametrize("max_cycles", [50, 51, 1000])
+def test_run_hook(max_cycles):
+    emulator = load_emulator()
+    calls = []
+    executed = emulator.run(
+        max_cycles, lambda pc, length, nextPc: calls.append((pc, length, nextPc)))
+    assert executed == max_cycles == sum(length for _, length, _ in calls)
+    # The hook follows the program counter, block by block.
+    assert calls[0][0] == 0
+    assert all(nextPc == pc for (_, _, nextPc), (pc, _, _) in zip(calls, calls[1:]))
+    assert calls[-1][2] == emulator.pc
+
+    single = load_emulator()
+    singleCalls = []
+    single.run_instructions(
+        max_cycles, lambda pc, length, nextPc: singleCalls.append(pc))
+    assert single.pc == emulator.pc
+    assert len(singleCalls) == max_cycles
+
+
+def test_snapshot():
+    emulator = load_emulator()
+    emulator.run(50)
+    snapshot_file = io.BytesIO()
+    emulator.save_snapshot(snapshot_file)
+    emulator.run(50)
+
+    restored = load_emulator()
+    snapshot_file.seek(0)
+    restored.restore_snapshot(snapshot_file)
+    restored.run(50)
+    assert (restored.a, restored.d, restored.pc, restored.cycles) \
+        == (emulator.a, emulator.d, emulator.pc, emulator.cycles)
+    assert restored.ram == emulator.ram
+
+
+@pytest.mark.parametrize("corrupt, message", [
+    (lambda snapshot: snapshot[:10], "truncated header"),
+    (lambda snapshot: b"NOTSNAPS" + snapshot[8:], "unknown format"),
+    (lambda snapshot: snapshot[:-20], "corrupt RAM"),
+    (lambda snapshot: snapshot[:SNAPSHOT_HEADER.size] + b"garbage", "corrupt RAM")])
+def test_invalid_snapshot(corrupt, message):
+    emulator = load_emulator()
+    snapshot_file = io.BytesIO()
+    emulator.save_snapshot(snapshot_file)
+    with pytest.raises(ValueError, match=message):
+        emulator.restore_snapshot(io.BytesIO(corrupt(snapshot_file.getvalue())))
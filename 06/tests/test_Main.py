@@ -0,0 +1,43 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import os
+import pytest
+from Main import assemble, write_words, write_binary_words
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("program", ["max/Max", "pong/Pong", "shift/Shift"])
+def test_reference_programs(program):
+    with open(os.path.join(PROJECT, program + ".asm"), 'r') as input_file:
+        words, _ = assemble(input_file)
+    output_file = io.StringIO()
+    write_words(words, output_file)
+    with open(os.path.join(PROJECT, program + ".hack"), 'r') as hack_file:
+        assert output_file.getvalue().split() == hack_file.read().split()
+
+
+def test_binary_words():
+    words, _ = assemble(io.StringIO("@32767\nD=A\n"))
+    output_file = io.BytesIO()
+    write_binary_words(words, output_file)
+    assert output_file.getvalue() == b"\xff\x7f\x10\xec"
+
+
+def test_constant_out_of_range():
+    with pytest.raises(ValueError, match="@70000"):
+        assemble(io.StringIO("@70000\nD=A\n"))
+    with pytest.raises(ValueError, match="@32768"):
+        assemble(io.StringIO("@32768\nD=A\n"))
+
+
+def test_label_out_of_range():
+    # The label follows 32K instructions, so A-instructions can not hold it.
+    with pytest.raises(ValueError, match="@FAR"):
+        assemble(io.StringIO("@FAR\n" + "D=A\n" * 0x8000 + "(FAR)\n0;JMP\n"))
@@ -0,0 +1,97 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import json
+import os
+from Emulator import Emulator
+from Main import assemble
+from Profiler import Profiler
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# ProfileCalls runs 6 bootstrap instructions, 34 instructions of Sys.init,
+# the 9 instructions of the shared call routine on behalf of Sys.init, and 2
+# calls to Main.count of 16 and 12 instructions, and then loops in Sys.halt,
+# 3 instructions per iteration.
+CYCLES_BEFORE_HALT = 6 + 34 + 9 + 28
+
+
+def load_profiler() -> Profiler:
+    with open(os.path.join(FIXTURES, "ProfileCalls.asm"), 'r') as input_file:
+        words, _ = assemble(input_file)
+    with open(os.path.join(FIXTURES, "ProfileCalls.sym.json"), 'r') as symbols_file:
+        symbol_map = json.load(symbols_file)
+    return Profiler(Emulator(words), symbol_map)
+
+
+def test_symbol_map_fixture_matches_assembler():
+    with open(os.path.join(FIXTURES, "ProfileCalls.asm"), 'r') as input_file:
+        _, symbolTable = assemble(input_file)
+    with open(os.path.join(FIXTURES, "ProfileCalls.sym.json"), 'r') as symbols_file:
+        assert symbolTable.symbol_map() == json.load(symbols_file)
+
+
+def test_flat_profile():
+    profiler = load_profiler()
+    assert profiler.run(CYCLES_BEFORE_HALT + 300) == CYCLES_BEFORE_HALT + 300
+    assert profiler.flat_profile() == "\n".join([
+        "300\t79.58%\tSys.halt",
+        "34\t9.02%\tSys.init",
+        "28\t7.43%\tMain.count",
+        "9\t2.39%\tSHARED_CALL",
+        "6\t1.59%\t(bootstrap)",
+        "total: 377 instructions"])
+
+
+def test_local_labels():
+    profiler = load_profiler()
+    profiler.run(CYCLES_BEFORE_HALT + 300)
+    cycles = profiler.label_cycles(local_labels=True)
+    # Of the labels at the entry of a function, the function is preferred.
+    assert cycles["Main.count"] == 28
+    assert "Sys.init$ret.2" not in cycles
+    assert cycles["Sys.init"] == 12
+    assert cycles["Sys.init$ret.0"] == 14
+    assert cycles["Sys.init$ret.1"] == 8
+    assert cycles["Sys.halt"] == 300
+
+
+def test_collapsed_stacks():
+    profiler = load_profiler()
+    profiler.run(CYCLES_BEFORE_HALT + 300)
+    output_file = io.StringIO()
+    profiler.write_collapsed_stacks(output_file)
+    assert output_file.getvalue() == (
+        "(bootstrap) 6\n"
+        "(bootstrap);Sys.init 43\n"
+        "(bootstrap);Sys.init;Main.count 28\n"
+        "(bootstrap);Sys.init;Sys.halt 300\n")
+
+
+def test_loops_at_function_entries_are_not_calls():
+    # Main.count and Sys.halt start with a loop, and the loop of Main.count
+    # shares its address with a return address of Sys.init.
+    profiler = load_profiler()
+    executed = profiler.run(100000)
+    assert executed == 100000
+    assert len(profiler.stack) == 3
+    assert len(profiler.nodeNames) == 4
+    assert sum(profiler.label_cycles().values()) == executed
+    assert sum(profiler.stack_cycles().values()) == executed
+    assert profiler.stack_cycles()["(bootstrap);Sys.init;Sys.halt"] \
+        == executed - CYCLES_BEFORE_HALT
+
+
+def test_run_in_parts():
+    whole = load_profiler()
+    whole.run(1000)
+    parts = load_profiler()
+    # The parts end in the middle of blocks.
+    for cycles in (10, 31, 7, 952):
+        parts.run(cycles)
+    assert parts.address_counts() == whole.address_counts()
+    assert parts.stack_cycles() == whole.stack_cycles()
@@ -6,6 +6,7 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
+from TemplateCache import TemplateCache
 
 
 INITIAL_STACK_POINTER = 256
@@ -74,6 +75,36 @@ ARITHMETIC_TRANSLATOR = {
     )
 }
 
+# When the top of the stack is cached in D, arithmetic commands compute their
+# result into D, with the second operand (if any) read from RAM.
+ARITHMETIC_IN_D_TRANSLATOR = {
+    "add": "@SP\nAM=M-1\nD=D+M\n",
+    "sub": "@SP\nAM=M-1\nD=M-D\n",
+    "and": "@SP\nAM=M-1\nD=D&M\n",
+    "or": "@SP\nAM=M-1\nD=D|M\n",
+    "neg": "D=-D\n",
+    "not": "D=!D\n",
+    "shiftleft": "D=D<<\n",
+    "shiftright": "D=D>>\n"
+}
+
+# A push immediately followed by one of these commands is fused into a single
+# update of the top of the stack, with the pushed value in D.
+FUSED_ARITHMETIC_TRANSLATOR = {
+    "add": "M=D+M\n",
+    "sub": "M=M-D\n",
+    "and": "M=D&M\n",
+    "or": "M=D|M\n"
+}
+
+PUSH_D_CODE = (
+    "@SP\n"
+    "A=M\n"
+    "M=D\n"
+    "@SP\n"
+    "M=M+1\n"
+)
+
 SEGMENT_TO_ASSEMBLY = {
     "local": "LCL",
     "argument": "ARG",
@@ -82,20 +113,60 @@ SEGMENT_TO_ASSEMBLY = {
 }
 
 SEGMENT_TEMP_START_INDEX = 5
+# Indices up to this one are reached by incrementing A from the segment's base
+# address, which does not use D and is never longer than adding the index.
+SMALL_INDEX_LIMIT = 2
+
+# In compact mode, comparisons, calls and returns jump to these shared
+# routines, emitted once after the bootstrap code, instead of being inlined.
+# The return address is passed in R15, and a called function's address and
+# number of arguments in R13 and R14.
+SHARED_COMPARISON_LABEL = "SHARED_COMPARISON_"
+SHARED_CALL_LABEL = "SHARED_CALL"
+SHARED_RETURN_LABEL = "SHARED_RETURN"
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    def __init__(self, output_stream: typing.TextIO, compact: bool = False,
+                 cache_stack_top: bool = False, specialize: bool = False,
+                 template_cache: typing.Optional[TemplateCache] = None,
+                 inline_functions: typing.Optional[typing.Dict] = None) -> None:
         """Initializes the CodeWriter.
 
         Args:
             output_stream (typing.TextIO): output stream.
+            compact (bool): if this is True, comparisons, calls and returns
+                jump to shared routines instead of being inlined, which
+                makes the program much smaller but a little slower.
+            cache_stack_top (bool): if this is True, the top of the stack is
+                kept in D between consecutive commands, and only written to
+                RAM when another value is pushed, or before labels, jumps,
+                calls and returns.
+            specialize (bool): if this is True, cheaper instruction sequences
+                are used for small segment indices, and a push is fused with
+                a following pop, add, sub, and or or.
+            template_cache (typing.Optional[TemplateCache]): caches the
+                generated push and pop fragments. A new cache is created if
+                this is None. It should only be shared between CodeWriters
+                with the same options.
+            inline_functions (typing.Optional[typing.Dict]): the functions
+                which are expanded at their call sites instead of being
+                called, as found by Linker.inline_functions.
         """
         # Your code goes here!
         # Note that you can write to output_stream like so:
         # output_stream.write("Hello world! \n")
         self.output_stream = output_stream
+        self.compact = compact
+        self.cache_stack_top = cache_stack_top
+        self.stackTopInD = False
+        self.specialize = specialize
+        self.pendingPush = None
+        self.template_cache = template_cache if template_cache is not None \
+            else TemplateCache()
+        self.inline_functions = inline_functions or {}
+        self.inlineCounter = 0
         self.comparisonCounter = 0
         self.callCounter = 0
         self.current_function = ""
@@ -119,6 +190,38 @@ class CodeWriter:
         # For example, using code similar to:
         # input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
         self.filename = filename
+        # Static variables are named after the file they are declared in,
+        # which differs from the current file inside an inlined function.
+        self.staticFile = filename
+
+    def spill_stack_top(self) -> str:
+        """
+        Returns:
+            str: assembly code which writes the top of the stack from D to
+            RAM, if it is currently cached in D.
+        """
+        if not self.stackTopInD:
+            return ""
+        self.stackTopInD = False
+        return PUSH_D_CODE
+
+    def flush_pending_push(self) -> None:
+        """Writes the push which was delayed in order to be fused with the
+        next command, if there is one.
+        """
+        if self.pendingPush is None:
+            return
+        segment, index = self.pendingPush
+        self.pendingPush = None
+        self.write_push(segment, index)
+
+    def flush_stack_top(self) -> None:
+        """Writes the delayed push and the top of the stack from D to RAM, if
+        it is currently cached in D. Should be called before control flow, and
+        when the translation of a file ends.
+        """
+        self.flush_pending_push()
+        self.output_stream.write(self.spill_stack_top())
 
     def write_bootstrap(self) -> None:
         result = (
@@ -129,6 +232,45 @@ class CodeWriter:
             )
         self.output_stream.write(result)
         self.write_call(INITIAL_SYSTEM_FUNCTION_NAME, 0)
+        if self.compact:
+            self.write_shared_routines()
+
+    def write_shared_routines(self) -> None:
+        """Writes the routines shared by all comparisons, calls and returns
+        in compact mode. Each one is entered with a jump, and the comparison
+        and call routines jump back to the address in R15 when done.
+        """
+        result = ""
+        for command in ["eq", "gt", "lt"]:
+            result += (
+                f"({SHARED_COMPARISON_LABEL}{command})\n"
+                + self.comparison_code(command, f"{SHARED_COMPARISON_LABEL}{command}$", "")
+                + "@R15\n"
+                "A=M\n"
+                "0;JMP\n"
+            )
+        result += f"({SHARED_CALL_LABEL})\n"
+        for pointer in ["R15", "LCL", "ARG", "THIS", "THAT"]:
+            result += self.str_push_pointer_on_stack(pointer)
+        result += (         # ARG = SP-5-n_args
+            "@SP\n"
+            "D=M\n"
+            "@5\n"
+            "D=D-A\n"
+            "@R14\n"
+            "D=D-M\n"
+            "@ARG\n"
+            "M=D\n"
+            "@SP\n"        # LCL = SP
+            "D=M\n"
+            "@LCL\n"
+            "M=D\n"
+            "@R13\n"       # goto function
+            "A=M\n"
+            "0;JMP\n"
+        )
+        result += f"({SHARED_RETURN_LABEL})\n" + self.return_code()
+        self.output_stream.write(result)
 
     def write_arithmetic(self, command: str) -> None:
         """Writes assembly code that is the translation of the given 
@@ -143,12 +285,72 @@ class CodeWriter:
         neg, not, shiftleft, shiftright
         """
         
+        if (self.pendingPush is not None
+                and command in FUSED_ARITHMETIC_TRANSLATOR.keys()):
+            self.write_fused_arithmetic(command)
+            return
+        self.flush_pending_push()
         if (command in ["eq", "gt", "lt"]):
             self.write_comparison(command)
+        elif self.stackTopInD:
+            self.output_stream.write(
+                f"// {command}\n" + ARITHMETIC_IN_D_TRANSLATOR[command])
         else:
             self.output_stream.write(ARITHMETIC_TRANSLATOR[command])
         
+    def write_fused_arithmetic(self, command: str) -> None:
+        """Writes the delayed push together with the given arithmetic command,
+        updating the top of the stack in place.
+        """
+        segment, index = self.pendingPush
+        self.pendingPush = None
+        result = f"// push {segment} {index}\n// {command}\n"
+        if segment == "constant" and index == 1 and command in ["add", "sub"]:
+            result += (
+                "@SP\n"
+                "A=M-1\n"
+                + ("M=M+1\n" if command == "add" else "M=M-1\n")
+            )
+        else:
+            result += (
+                self.cached_code("load", segment, index, self.load_code)
+                + "@SP\n"
+                "A=M-1\n"
+                + FUSED_ARITHMETIC_TRANSLATOR[command]
+            )
+        self.output_stream.write(result)
+
     def write_comparison(self, command: str):
+        self.flush_stack_top()
+        if self.compact:
+            return_address = f"{self.filename}$COMPARISON_RETURN{self.comparisonCounter}"
+            result = (
+                f"// {command}\n"
+                f"@{return_address}\n"
+                "D=A\n"
+                "@R15\n"
+                "M=D\n"
+                f"@{SHARED_COMPARISON_LABEL}{command}\n"
+                "0;JMP\n"
+                f"({return_address})\n"
+            )
+        else:
+            result = f"// {command}\n" + self.comparison_code(
+                command, f"{self.filename}$", str(self.comparisonCounter))
+        self.output_stream.write(result)
+        self.comparisonCounter += 1
+
+    def comparison_code(self, command: str, labelPrefix: str, labelSuffix: str) -> str:
+        """
+        Args:
+            command (str): "eq", "gt" or "lt".
+            labelPrefix (str): prepended to the labels of the comparison.
+            labelSuffix (str): appended to the labels of the comparison.
+
+        Returns:
+            str: assembly code which replaces the two topmost values of the
+            stack with the result of the comparison between them.
+        """
         jumpComparison = {
             "eq": "JEQ",
             "gt": "JGT",
@@ -160,66 +362,63 @@ class CodeWriter:
             "lt": ("0", "-1")
         }
 
-        result = (
-            f"// {command}\n"
+        return (
             "@SP\n"
             "AM=M-1\n"
             "D=M\n"
             # jump #1 D sign 
-            f"@FIRST_NEG{self.comparisonCounter}\n"
+            f"@{labelPrefix}FIRST_NEG{labelSuffix}\n"
             "D;JLT\n"
             "@SP\n"
             "A=M-1\n"
             # jump #2 D sign
             "D=M\n"
-            f"@SECOND_NEG_FIRST_POS{self.comparisonCounter}\n"
+            f"@{labelPrefix}SECOND_NEG_FIRST_POS{labelSuffix}\n"
             "D;JLT\n"
             # both are positive
-            f"@REGULAR_COMPARISON{self.comparisonCounter}\n"
+            f"@{labelPrefix}REGULAR_COMPARISON{labelSuffix}\n"
             "0;JMP\n"
-            f"(FIRST_NEG{self.comparisonCounter})\n"
+            f"({labelPrefix}FIRST_NEG{labelSuffix})\n"
             "@SP\n"
             "A=M-1\n"
             "D=M\n"
-            f"@SECOND_NEG_FIRST_NEG{self.comparisonCounter}\n"
+            f"@{labelPrefix}SECOND_NEG_FIRST_NEG{labelSuffix}\n"
             "D;JLT\n"
             # first is negative second is positive
             "@SP\n"
             "A=M-1\n"
             f"M={comparisonResult[command][0]}\n"
-            f"@COMP_END{self.comparisonCounter}\n"
+            f"@{labelPrefix}COMP_END{labelSuffix}\n"
             "0;JMP\n"
             # first is positive second is negative
-            f"(SECOND_NEG_FIRST_POS{self.comparisonCounter})\n"
+            f"({labelPrefix}SECOND_NEG_FIRST_POS{labelSuffix})\n"
             "@SP\n"
             "A=M-1\n"
             f"M={comparisonResult[command][1]}\n"
-            f"@COMP_END{self.comparisonCounter}\n"
+            f"@{labelPrefix}COMP_END{labelSuffix}\n"
             "0;JMP\n"
-            f"(SECOND_NEG_FIRST_NEG{self.comparisonCounter})\n"
-            f"@REGULAR_COMPARISON{self.comparisonCounter}\n"
+            f"({labelPrefix}SECOND_NEG_FIRST_NEG{labelSuffix})\n"
+            f"@{labelPrefix}REGULAR_COMPARISON{labelSuffix}\n"
             "0;JMP\n"
-            f"(REGULAR_COMPARISON{self.comparisonCounter})\n"
+            f"({labelPrefix}REGULAR_COMPARISON{labelSuffix})\n"
             "@SP\n"
             "A=M\n"
             "D=M\n"
             "A=A-1\n"
             "D=M-D\n"
-            f"@COMP_SUCCESS{self.comparisonCounter}\n"
+            f"@{labelPrefix}COMP_SUCCESS{labelSuffix}\n"
             f"D;{jumpComparison[command]}\n"
             "@SP\n"
             "A=M-1\n"
             "M=0\n"
-            f"@COMP_END{self.comparisonCounter}\n"
+            f"@{labelPrefix}COMP_END{labelSuffix}\n"
             "0;JMP\n"
-            f"(COMP_SUCCESS{self.comparisonCounter})\n"
+            f"({labelPrefix}COMP_SUCCESS{labelSuffix})\n"
             "@SP\n"
             "A=M-1\n"
             "M=-1\n"
-            f"(COMP_END{self.comparisonCounter})\n"
+            f"({labelPrefix}COMP_END{labelSuffix})\n"
         )
-        self.output_stream.write(result)
-        self.comparisonCounter += 1
 
 
     def write_push_pop(self, command: str, segment: str, index: int) -> None:
@@ -236,14 +435,72 @@ class CodeWriter:
         # be translated to the assembly symbol "Xxx.i". In the subsequent
         # assembly process, the Hack assembler will allocate these symbolic
         # variables to the RAM, starting at address 16.
-        if command == "C_PUSH":
-            self.output_stream.write(self.push_code(segment, index))
+        if self.pendingPush is not None and command == "C_POP":
+            pushSegment, pushIndex = self.pendingPush
+            self.pendingPush = None
+            self.output_stream.write(
+                f"// push {pushSegment} {pushIndex}\n// pop {segment} {index}\n"
+                + self.cached_code("load", pushSegment, pushIndex, self.load_code)
+                + self.cached_code("store", segment, index, self.store_code))
+            return
+        self.flush_pending_push()
+        if self.specialize and not self.stackTopInD and command == "C_PUSH":
+            self.pendingPush = (segment, index)
+        elif command == "C_PUSH":
+            self.write_push(segment, index)
+        elif self.stackTopInD and command == "C_POP":
+            self.output_stream.write(
+                f"// pop {segment} {index}\n"
+                + self.cached_code("store", segment, index, self.store_code))
+            self.stackTopInD = False
         elif command == "C_POP":
-            self.output_stream.write(self.pop_code(segment, index))
+            self.output_stream.write(
+                self.cached_code("pop", segment, index, self.pop_code))
+
+    def write_push(self, segment: str, index: int) -> None:
+        if self.cache_stack_top:
+            result = (f"// push {segment} {index}\n" + self.spill_stack_top()
+                      + self.cached_code("load", segment, index, self.load_code))
+            self.stackTopInD = True
+            self.output_stream.write(result)
+        else:
+            self.output_stream.write(
+                self.cached_code("push", segment, index, self.push_code))
+
+    def cached_code(self, kind: str, segment: str, index: int,
+                    build: typing.Callable[[str, int], str]) -> str:
+        """Looks up the fragment of a push or a pop in the template cache,
+        generating it on a miss. Static fragments also depend on the file.
+
+        Args:
+            kind (str): the kind of fragment, "push", "pop", "load" or "store".
+            segment (str): the memory segment to operate on.
+            index (int): the index in the memory segment.
+            build (typing.Callable[[str, int], str]): generates the fragment.
+
+        Returns:
+            str: the fragment.
+        """
+        fileScope = self.staticFile if segment == "static" else None
+        return self.template_cache.lookup(
+            (kind, segment, index, fileScope), lambda: build(segment, index))
 
     def push_code(self, segment: str, index: int):
-        result = f"// push {segment} {index}\n"
-        if segment in SEGMENT_TO_ASSEMBLY.keys():
+        load = self.load_code(segment, index)
+        if load == "":
+            return ""
+        return f"// push {segment} {index}\n" + load + PUSH_D_CODE
+
+    def load_code(self, segment: str, index: int) -> str:
+        """
+        Returns:
+            str: assembly code which loads the value at the given index of the
+            given segment into D.
+        """
+        result = ""
+        if segment in SEGMENT_TO_ASSEMBLY.keys() and self.is_small_index(index):
+            result += self.address_code(segment, index) + "D=M\n"
+        elif segment in SEGMENT_TO_ASSEMBLY.keys():
             result += (
                 f"@{SEGMENT_TO_ASSEMBLY[segment]}\n"
                 "D=M\n"
@@ -257,7 +514,7 @@ class CodeWriter:
                 "D=A\n"
             )
         elif segment == "static":
-            static_name = self.filename + "." + str(index)
+            static_name = self.staticFile + "." + str(index)
             result += (
                 f"@{static_name}\n"
                 "D=M\n"
@@ -275,18 +532,34 @@ class CodeWriter:
             )
         else:
             return ""
-        result += (
-            "@SP\n"
-            "A=M\n"
-            "M=D\n"
-            "@SP\n"
-            "M=M+1\n"
-            )
         return result
 
     def pop_code(self, segment: str, index: int):
         result = f"// pop {segment} {index}\n"
-        if segment in SEGMENT_TO_ASSEMBLY.keys():
+        if segment in SEGMENT_TO_ASSEMBLY.keys() and self.is_small_index(index):
+            result += (
+                "@SP\n"
+                "AM=M-1\n"
+                "D=M\n"
+                + self.address_code(segment, index)
+                + "M=D\n"
+            )
+        elif segment in SEGMENT_TO_ASSEMBLY.keys() and self.specialize:
+            # Computes the address into D, and then uses the popped value's
+            # RAM cell to recover it without going through a variable:
+            # A = (address + value) - value, M = (address + value) - address.
+            result += (
+                f"@{SEGMENT_TO_ASSEMBLY[segment]}\n"
+                "D=M\n"
+                f"@{index}\n"
+                "D=A+D\n"
+                "@SP\n"
+                "AM=M-1\n"
+                "D=D+M\n"
+                "A=D-M\n"
+                "M=D-A\n"
+            )
+        elif segment in SEGMENT_TO_ASSEMBLY.keys():
             result += (
                 f"@{SEGMENT_TO_ASSEMBLY[segment]}\n"
                 "D=M\n"
@@ -302,7 +575,7 @@ class CodeWriter:
                 "M=D\n"
             )
         elif segment == "static":
-            static_name = self.filename + "." + str(index)
+            static_name = self.staticFile + "." + str(index)
             result += (
                 "@SP\n"
                 "AM=M-1\n"
@@ -331,6 +604,55 @@ class CodeWriter:
             return ""
         return result
 
+    def is_small_index(self, index: int) -> bool:
+        return self.specialize and index <= SMALL_INDEX_LIMIT
+
+    @staticmethod
+    def address_code(segment: str, index: int) -> str:
+        """
+        Returns:
+            str: assembly code which sets A to the address of the given index
+            of a local, argument, this or that segment, without using D.
+        """
+        return f"@{SEGMENT_TO_ASSEMBLY[segment]}\nA=M\n" + "A=A+1\n" * index
+
+    def store_code(self, segment: str, index: int) -> str:
+        """
+        Returns:
+            str: assembly code which stores D at the given index of the given
+            segment.
+        """
+        if segment in SEGMENT_TO_ASSEMBLY.keys() and self.is_small_index(index):
+            return self.address_code(segment, index) + "M=D\n"
+        elif segment in SEGMENT_TO_ASSEMBLY.keys():
+            return (
+                "@R13\n"
+                "M=D\n"
+                f"@{SEGMENT_TO_ASSEMBLY[segment]}\n"
+                "D=M\n"
+                f"@{index}\n"
+                "D=A+D\n"
+                "@pop\n"
+                "M=D\n"
+                "@R13\n"
+                "D=M\n"
+                "@pop\n"
+                "A=M\n"
+                "M=D\n"
+            )
+        elif segment == "static":
+            ramLocation = self.staticFile + "." + str(index)
+        elif segment == "temp":
+            ramLocation = SEGMENT_TEMP_START_INDEX + index
+        elif segment == "pointer":
+            ramLocation = SEGMENT_TO_ASSEMBLY["this"] if index == 0 else SEGMENT_TO_ASSEMBLY["that"]
+        else:
+            return ""
+        return (
+            f"@{ramLocation}\n"
+            "M=D\n"
+        )
+
     def write_label(self, label: str) -> None:
         """Writes assembly code that affects the label command. 
         Let "Xxx.foo" be a function within the file Xxx.vm. The handling of
@@ -342,6 +664,7 @@ class CodeWriter:
         Args:
             label (str): the label to write.
         """
+        self.flush_stack_top()
         result = f"({self.current_function}${label})\n"
         self.output_stream.write(result)
     
@@ -351,6 +674,7 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
+        self.flush_stack_top()
         result = (
             f"@{self.current_function}${label}\n"
             "0;JMP\n")
@@ -362,11 +686,16 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
-        result = (
-            f"// if-goto {label}\n"
-            "@SP\n"
-            "AM=M-1\n"
-            "D=M\n"
+        self.flush_pending_push()
+        result = f"// if-goto {label}\n"
+        if self.stackTopInD:
+            self.stackTopInD = False
+        else:
+            result += (
+                "@SP\n"
+                "AM=M-1\n"
+                "D=M\n")
+        result += (
             f"@{self.current_function}${label}\n"
             "D;JNE\n")
         self.output_stream.write(result)
@@ -390,6 +719,7 @@ class CodeWriter:
         # repeat n_vars times:  // n_vars = number of local variables
         #   push constant 0     // initializes the local variables to 0
 
+        self.flush_stack_top()
         self.current_function = function_name
 
         push_zero_on_stack = (
@@ -430,8 +760,33 @@ class CodeWriter:
         # goto function_name    // transfers control to the callee
         # (return_address)      // injects the return address label into the code
         
+        if function_name in self.inline_functions:
+            self.write_inline_call(function_name, n_args)
+            return
+        self.flush_stack_top()
         return_address = f"{self.current_function}$ret.{self.callCounter}"
         result = f"// call {function_name} {n_args}\n"
+        if self.compact:
+            result += (
+                f"@{return_address}\n"
+                "D=A\n"
+                "@R15\n"
+                "M=D\n"
+                f"@{n_args}\n"
+                "D=A\n"
+                "@R14\n"
+                "M=D\n"
+                f"@{function_name}\n"
+                "D=A\n"
+                "@R13\n"
+                "M=D\n"
+                f"@{SHARED_CALL_LABEL}\n"
+                "0;JMP\n"
+                f"({return_address})\n"
+            )
+            self.output_stream.write(result)
+            self.callCounter += 1
+            return
         result += (
             f"@{return_address}\n"
             "D=A\n"
@@ -468,6 +823,165 @@ class CodeWriter:
         self.output_stream.write(result)
         self.callCounter += 1
 
+    def write_inline_call(self, function_name: str, n_args: int) -> None:
+        """Writes the body of an inlined function in place of a call to it.
+        The arguments are left on the stack, and the saved pointers and the
+        local variables are pushed above them. Together they make the frame
+        of the inlined function, which is addressed relative to SP, since the
+        depth of the stack is known before every command of the body. Labels
+        are renamed to be unique to this call site.
+
+        Args:
+            function_name (str): the name of the function to call.
+            n_args (int): the number of arguments of the function.
+        """
+        function = self.inline_functions[function_name]
+        self.flush_stack_top()
+        self.output_stream.write(f"// inline {function_name} {n_args}\n")
+        labelPrefix = f"{function_name}$inline{self.inlineCounter}$"
+        self.inlineCounter += 1
+        for pointer in function.saved_pointers:
+            self.write_push_pop("C_PUSH", "pointer", pointer)
+        for _ in range(function.n_vars):
+            self.write_push_pop("C_PUSH", "constant", 0)
+        localsStart = n_args + len(function.saved_pointers)
+        frameSize = localsStart + function.n_vars
+
+        callerStaticFile = self.staticFile
+        self.staticFile = function.filename
+        needsEndLabel = False
+        lastIndex = len(function.commands) - 1
+        for commandIndex, command in enumerate(function.commands):
+            depth = frameSize + function.depths[commandIndex]
+            command_type = command.command_type
+            if command_type in ("C_PUSH", "C_POP") \
+                    and command.arg1 in ("argument", "local"):
+                position = command.arg2 if command.arg1 == "argument" \
+                    else localsStart + command.arg2
+                self.flush_stack_top()
+                if command_type == "C_PUSH":
+                    self.output_stream.write(
+                        f"// push {command.arg1} {command.arg2}\n"
+                        + self.frame_push_code(depth - position))
+                else:
+                    self.output_stream.write(
+                        f"// pop {command.arg1} {command.arg2}\n"
+                        + self.frame_pop_code(depth - 1 - position))
+            elif command_type == "C_RETURN":
+                self.flush_stack_top()
+                self.output_stream.write(self.inline_return_code(
+                    depth, n_args, function.saved_pointers))
+                if commandIndex != lastIndex:
+                    self.write_goto(labelPrefix + "END")
+                    needsEndLabel = True
+            elif command_type == "C_LABEL":
+                self.write_label(labelPrefix + command.arg1)
+            elif command_type == "C_GOTO":
+                self.write_goto(labelPrefix + command.arg1)
+            elif command_type == "C_IF":
+                self.write_if(labelPrefix + command.arg1)
+            elif command_type == "C_ARITHMETIC":
+                self.write_arithmetic(command.arg1)
+            else:
+                self.write_push_pop(command_type, command.arg1, command.arg2)
+        if needsEndLabel:
+            self.write_label(labelPrefix + "END")
+        self.flush_stack_top()
+        self.staticFile = callerStaticFile
+
+    @staticmethod
+    def frame_push_code(offset: int) -> str:
+        """
+        Returns:
+            str: assembly code which pushes RAM[SP - offset].
+        """
+        if offset == 1:
+            result = (
+                "@SP\n"
+                "A=M-1\n"
+                "D=M\n"
+            )
+        else:
+            result = (
+                "@SP\n"
+                "D=M\n"
+                f"@{offset}\n"
+                "A=D-A\n"
+                "D=M\n"
+            )
+        return result + PUSH_D_CODE
+
+    @staticmethod
+    def frame_pop_code(offset: int) -> str:
+        """
+        Returns:
+            str: assembly code which pops the top of the stack into
+            RAM[SP - offset], where SP is its value after the pop.
+        """
+        # The popped value stays in RAM[SP], which is used to get the target
+        # address into A without a variable: A = (target + value) - value,
+        # M = (target + value) - target.
+        return (
+            "@SP\n"
+            "M=M-1\n"
+            "D=M\n"
+            f"@{offset}\n"
+            "D=D-A\n"
+            "@SP\n"
+            "A=M\n"
+            "D=D+M\n"
+            "A=D-M\n"
+            "M=D-A\n"
+        )
+
+    @staticmethod
+    def inline_return_code(depth: int, n_args: int,
+                           saved_pointers: typing.List[int]) -> str:
+        """
+        Args:
+            depth (int): the number of values on the stack above the first
+                argument, including the returned value.
+            n_args (int): the number of arguments of the function.
+            saved_pointers (typing.List[int]): the pointers saved above the
+                arguments.
+
+        Returns:
+            str: assembly code which restores the saved pointers, and
+            replaces the frame of an inlined function by its returned value.
+        """
+        result = (
+            "// return\n"
+            "@SP\n"
+            "AM=M-1\n"
+            "D=M\n"
+            "@R13\n"
+            "M=D\n"
+        )
+        for savedIndex, pointer in enumerate(saved_pointers):
+            result += (
+                "@SP\n"
+                "D=M\n"
+                f"@{depth - 1 - n_args - savedIndex}\n"
+                "A=D-A\n"
+                "D=M\n"
+                f"@{SEGMENT_TO_ASSEMBLY['this'] if pointer == 0 else SEGMENT_TO_ASSEMBLY['that']}\n"
+                "M=D\n"
+            )
+        result += (
+            "@SP\n"
+            "D=M\n"
+            f"@{depth - 1}\n"
+            "D=D-A\n"
+            "@SP\n"
+            "M=D+1\n"
+            "@R13\n"
+            "D=M\n"
+            "@SP\n"
+            "A=M-1\n"
+            "M=D\n"
+        )
+        return result
+
     def str_push_pointer_on_stack(self, pointer: str) -> str:
         return (
             f"@{pointer}\n"
@@ -490,9 +1004,18 @@ class CodeWriter:
         # ARG = *(frame-3)              // restores ARG for the caller
         # LCL = *(frame-4)              // restores LCL for the caller
         # goto return_address           // go to the return address
-        
-        result = "// return\n"
-        result += (             # frame = LCL
+
+        self.flush_stack_top()
+        if self.compact:
+            self.output_stream.write(
+                "// return\n"
+                f"@{SHARED_RETURN_LABEL}\n"
+                "0;JMP\n")
+        else:
+            self.output_stream.write("// return\n" + self.return_code())
+
+    def return_code(self) -> str:
+        result = (              # frame = LCL
             "@LCL\n"
             "D=M\n"
             "@R13\n"
@@ -540,5 +1063,4 @@ class CodeWriter:
             "A=M\n"
             "0;JMP\n"
         )
-
-        self.output_stream.write(result)
+        return result
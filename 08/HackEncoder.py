@@ -0,0 +1,168 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import sys
+import typing
+from array import array
+
+# The encodings are shared with the assembler. Its directory is searched
+# last, since its Parser and Main have the same names as the ones here.
+ASSEMBLER_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "06")
+if ASSEMBLER_DIRECTORY not in sys.path:
+    sys.path.append(ASSEMBLER_DIRECTORY)
+from Code import Code
+from SymbolTable import SymbolTable
+
+REGISTER_BIT_COUNT = 16
+OUTPUT_CHUNK_SIZE = 4096
+
+# The complete 16-bit word of every valid C-instruction, keyed by its text,
+# so encoding a C-instruction is a single lookup.
+C_INSTRUCTION_WORDS = {
+    (f"{dest}=" if dest else "") + comp + (f";{jump}" if jump else ""): word
+    for (dest, comp, jump), word in Code.C_INSTRUCTION_TRANSLATOR.items()
+}
+
+
+def decode_line(line: str) -> typing.Tuple[
+        typing.Optional[int], typing.Optional[str], bool]:
+    """
+    Args:
+        line (str): a line of Hack assembly.
+
+    Returns:
+        typing.Tuple[typing.Optional[int], typing.Optional[str], bool]: the
+        machine word of the line if it is known without the symbol table,
+        otherwise the symbol it defines or refers to, and whether it is a
+        label. Empty lines have neither.
+
+    Raises:
+        ValueError: if the line is not a valid instruction, or holds a
+            constant which does not fit in 15 bits.
+    """
+    line = "".join(line.split("//")[0].split())
+    if line == "":
+        return None, None, False
+    word = C_INSTRUCTION_WORDS.get(line)
+    if word is not None:
+        return word, None, False
+    if line.startswith("("):
+        return None, line[1:-1], True
+    if line.startswith("@"):
+        symbol = line[1:]
+        if symbol.isdecimal():
+            return Code.a_instruction(symbol, int(symbol)), None, False
+        return None, symbol, False
+    raise ValueError(f"invalid instruction: {line}")
+
+
+class HackEncoder:
+    """Encodes Hack assembly directly into machine words, so that the VM
+    translator can produce a .hack program without writing an assembly file
+    and assembling it again. It can be written to like a text stream. Labels
+    are resolved in a single pass: a reference to a symbol which is not known
+    yet is left as a placeholder, and backpatched by finish(), which also
+    allocates the variables in order of first appearance, exactly like the
+    assembler.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new encoder, with no words."""
+        self.words = array('H')
+        self.symbols = dict(SymbolTable.PREDEFINED_SYMBOLS)
+        self.unresolved = []
+        self.partialLine = ""
+        # Generated assembly repeats a small number of distinct lines over and
+        # over, so each distinct line is decoded only once.
+        self.decodedLines = {}
+
+    def write(self, text: str) -> int:
+        """Encodes the complete lines of the given text. An incomplete last
+        line is kept until the rest of it is written.
+
+        Args:
+            text (str): Hack assembly code.
+
+        Returns:
+            int: the length of the text, like a text stream.
+        """
+        lines = (self.partialLine + text).split("\n")
+        self.partialLine = lines.pop()
+        for line in lines:
+            self.encode_line(line)
+        return len(text)
+
+    def encode_line(self, line: str) -> None:
+        """
+        Args:
+            line (str): a line of Hack assembly.
+
+        Raises:
+            ValueError: see decode_line.
+        """
+        decoded = self.decodedLines.get(line)
+        if decoded is None:
+            decoded = self.decodedLines[line] = decode_line(line)
+        word, symbol, isLabel = decoded
+        if word is not None:
+            self.words.append(word)
+        elif isLabel:
+            self.symbols[symbol] = len(self.words)
+        elif symbol in self.symbols:
+            self.words.append(Code.a_instruction(symbol, self.symbols[symbol]))
+        elif symbol is not None:
+            self.unresolved.append((len(self.words), symbol))
+            self.words.append(0)
+
+    def finish(self) -> array:
+        """Encodes the last line, allocates the variables and backpatches the
+        references to symbols which were not known when they were encoded.
+
+        Returns:
+            array: the machine words of the program.
+
+        Raises:
+            ValueError: if a label does not fit in 15 bits.
+        """
+        self.encode_line(self.partialLine)
+        self.partialLine = ""
+        variableAddress = SymbolTable.NAMED_VARIABLE_MIN_ADDRESS
+        for wordIndex, symbol in self.unresolved:
+            if symbol not in self.symbols:
+                self.symbols[symbol] = variableAddress
+                variableAddress += 1
+            self.words[wordIndex] = Code.a_instruction(symbol, self.symbols[symbol])
+        self.unresolved = []
+        return self.words
+
+    def write_text(self, output_file: typing.TextIO) -> None:
+        """Writes the machine words as text, one word per line, in chunks of
+        OUTPUT_CHUNK_SIZE lines, in the assembler's .hack format.
+
+        Args:
+            output_file (typing.TextIO): writes all output to this file.
+        """
+        for chunkStart in range(0, len(self.words), OUTPUT_CHUNK_SIZE):
+            if chunkStart > 0:
+                output_file.write("\n")
+            output_file.write("\n".join(
+                f"{word:0{REGISTER_BIT_COUNT}b}"
+                for word in self.words[chunkStart:chunkStart + OUTPUT_CHUNK_SIZE]))
+
+    def write_binary(self, output_file: typing.BinaryIO) -> None:
+        """Writes the machine words as a packed array of little-endian
+        unsigned 16-bit integers, in the assembler's .bin format.
+
+        Args:
+            output_file (typing.BinaryIO): writes all output to this file.
+        """
+        binaryWords = array('H', self.words)
+        if sys.byteorder == "big":
+            binaryWords.byteswap()
+        output_file.write(memoryview(binaryWords))
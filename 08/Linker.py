@@ -0,0 +1,249 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import typing
+from Parser import Parser, Command
+
+ENTRY_FUNCTION_NAME = "Sys.init"
+FUNCTION_COMMENT_PREFIX = "// function "
+# The change in the stack's depth made by every arithmetic command.
+ARITHMETIC_STACK_EFFECT = {
+    "add": -1, "sub": -1, "and": -1, "or": -1, "eq": -1, "gt": -1, "lt": -1,
+    "neg": 0, "not": 0, "shiftleft": 0, "shiftright": 0
+}
+
+
+def stack_depths(commands: typing.List[Command]) -> typing.Optional[typing.List[int]]:
+    """Computes the depth of the stack before every command of a function's
+    body, relative to its depth after the function's local variables were
+    pushed.
+
+    Args:
+        commands (typing.List[Command]): the body of the function.
+
+    Returns:
+        typing.Optional[typing.List[int]]: the depth before every command, or
+        None if it can not be determined statically: if it differs between
+        the paths reaching a label, if it becomes negative, or if a command
+        can only be reached by a jump to a label which is defined later.
+    """
+    labelDepths = {}
+    depths = []
+    depth = 0
+    for command in commands:
+        if command.command_type == "C_LABEL":
+            if depth is None:
+                depth = labelDepths.get(command.arg1)
+            elif labelDepths.setdefault(command.arg1, depth) != depth:
+                return None
+        if depth is None or depth < 0:
+            return None
+        depths.append(depth)
+        if command.command_type == "C_ARITHMETIC":
+            depth += ARITHMETIC_STACK_EFFECT[command.arg1]
+        elif command.command_type == "C_PUSH":
+            depth += 1
+        elif command.command_type in ("C_POP", "C_IF"):
+            depth -= 1
+        if command.command_type in ("C_GOTO", "C_IF"):
+            if labelDepths.setdefault(command.arg1, depth) != depth:
+                return None
+        if command.command_type in ("C_GOTO", "C_RETURN"):
+            depth = None
+        if command.command_type == "C_RETURN" and depths[-1] < 1:
+            return None
+        if depth is not None and depth < 0:
+            return None
+    return depths
+
+
+class InlineFunction:
+    """The body of a function which the CodeWriter expands at every call
+    site instead of calling it.
+    """
+    __slots__ = ("filename", "n_vars", "commands", "depths", "saved_pointers")
+
+    def __init__(self, filename: str, n_vars: int,
+                 commands: typing.List[Command], depths: typing.List[int]) -> None:
+        """
+        Args:
+            filename (str): the name of the function's file, without the
+                extension, which scopes its static variables.
+            n_vars (int): the number of local variables of the function.
+            commands (typing.List[Command]): the body of the function.
+            depths (typing.List[int]): the depth of the stack before every
+                command of the body, see stack_depths.
+        """
+        self.filename = filename
+        self.n_vars = n_vars
+        self.commands = commands
+        self.depths = depths
+        # The pointers the function sets, which a real call would have
+        # restored for the caller.
+        self.saved_pointers = sorted({
+            command.arg2 for command in commands
+            if command.command_type == "C_POP" and command.arg1 == "pointer"})
+
+
+class Linker:
+    """Links the .vm files of a whole program, dropping every function which
+    can not be reached by a chain of calls starting at Sys.init. Commands
+    which precede the first function of a file are always kept. If the program
+    does not define Sys.init, nothing is dropped.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new linker, with no files."""
+        # Every file is a list of (function name, commands) pairs, in the
+        # order the functions appear in the file. The commands preceding the
+        # first function belong to the function "".
+        self.files = []
+        self.calls = {}
+        self.removed = []
+
+    def add_file(self, input_file: typing.TextIO) -> None:
+        """Reads the functions of a single .vm file.
+
+        Args:
+            input_file (typing.TextIO): input file.
+        """
+        functions = [("", [])]
+        parser = Parser(input_file)
+        while parser.has_more_commands():
+            command_type = parser.command_type()
+            if command_type == "C_FUNCTION":
+                functions.append((parser.arg1(), []))
+                self.calls.setdefault(parser.arg1(), set())
+            elif command_type == "C_CALL":
+                self.calls.setdefault(functions[-1][0], set()).add(parser.arg1())
+            functions[-1][1].append(parser.currentLine)
+            parser.advance()
+        self.files.append((input_file.name, functions))
+
+    def inline_functions(self, max_size: int) -> typing.Dict[str, InlineFunction]:
+        """Finds the functions which can be inlined at their call sites: the
+        functions of at most max_size commands, which do not call other
+        functions, and whose stack depth is known statically at every command.
+
+        Args:
+            max_size (int): the maximal number of commands in the body of an
+                inlined function.
+
+        Returns:
+            typing.Dict[str, InlineFunction]: the inlined functions, by name.
+        """
+        result = {}
+        for name, functions in self.files:
+            filename, _ = os.path.splitext(os.path.basename(name))
+            for function_name, lines in functions:
+                if function_name in ("", ENTRY_FUNCTION_NAME) \
+                        or len(lines) - 1 > max_size:
+                    continue
+                commands = [Command(line) for line in lines]
+                body = commands[1:]
+                if any(command.command_type in ("C_CALL", "C_FUNCTION")
+                       for command in body):
+                    continue
+                depths = stack_depths(body)
+                if depths is not None:
+                    result[function_name] = InlineFunction(
+                        filename, commands[0].arg2, body, depths)
+        return result
+
+    def reachable_functions(
+            self, inlined: typing.Collection[str] = ()
+            ) -> typing.Optional[typing.Set[str]]:
+        """
+        Args:
+            inlined (typing.Collection[str]): functions which are inlined at
+                every call site, so calling them does not make them reachable.
+
+        Returns:
+            typing.Optional[typing.Set[str]]: the names of the functions which
+            are reachable from Sys.init, or None if it is not defined.
+        """
+        if ENTRY_FUNCTION_NAME not in self.calls:
+            return None
+        reachable = {"", ENTRY_FUNCTION_NAME}
+        stack = [ENTRY_FUNCTION_NAME, ""]
+        while stack:
+            function_name = stack.pop()
+            for callee in self.calls.get(function_name, ()):
+                if callee not in reachable and callee not in inlined:
+                    reachable.add(callee)
+                    stack.append(callee)
+        return reachable
+
+    def link(self, drop_unreachable: bool = True,
+             inlined: typing.Collection[str] = ()) -> typing.List[typing.Tuple[str, str]]:
+        """Drops the unreachable functions.
+
+        Args:
+            drop_unreachable (bool): if this is False, all the functions are
+                kept.
+            inlined (typing.Collection[str]): functions which are inlined at
+                every call site.
+
+        Returns:
+            typing.List[typing.Tuple[str, str]]: the name of every file, and
+            the kept commands of the file.
+        """
+        reachable = self.reachable_functions(inlined) if drop_unreachable \
+            else None
+        self.removed = []
+        result = []
+        for name, functions in self.files:
+            lines = []
+            for function_name, commands in functions:
+                if reachable is None or function_name in reachable:
+                    lines.extend(commands)
+                else:
+                    self.removed.append(function_name)
+            result.append((name, "\n".join(lines)))
+        return result
+
+    @staticmethod
+    def rom_sizes(lines: typing.List[str]) -> typing.Dict[str, int]:
+        """Counts the instructions of every function in a translated program,
+        using the comments the CodeWriter writes before every function.
+
+        Args:
+            lines (typing.List[str]): the lines of the assembly program.
+
+        Returns:
+            typing.Dict[str, int]: the number of instructions of every
+            function. Instructions preceding the first function, such as the
+            bootstrap code, are counted under "".
+        """
+        sizes = {"": 0}
+        function_name = ""
+        for line in lines:
+            line = line.strip()
+            if line.startswith(FUNCTION_COMMENT_PREFIX):
+                function_name = line[len(FUNCTION_COMMENT_PREFIX):].split()[0]
+                sizes.setdefault(function_name, 0)
+            elif line != "" and not line.startswith("//") \
+                    and not line.startswith("("):
+                sizes[function_name] += 1
+        return sizes
+
+    def report(self, lines: typing.List[str]) -> str:
+        """
+        Args:
+            lines (typing.List[str]): the lines of the linked assembly program.
+
+        Returns:
+            str: a human-readable report of the removed functions and of the
+            ROM size of every kept function, largest first.
+        """
+        sizes = self.rom_sizes(lines)
+        result = [f"{size}\t{function_name or '(bootstrap)'}" for function_name, size
+                  in sorted(sizes.items(), key=lambda item: -item[1])]
+        result.append(f"total: {sum(sizes.values())} instructions, "
+                      f"{len(self.removed)} unreachable functions removed")
+        return "\n".join(result)
@@ -5,13 +5,24 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import functools
+import io
 import os
-import sys
 import typing
+from concurrent.futures import ProcessPoolExecutor
 from Parser import Parser
 from CodeWriter import CodeWriter
+from PeepholeOptimizer import PeepholeOptimizer
+from Linker import Linker
+from TemplateCache import TemplateCache
+from HackEncoder import HackEncoder
 
-def translate_file(input_file: typing.TextIO, output_file: typing.TextIO, bootstrap: bool) -> None:
+def translate_file(input_file: typing.TextIO, output_file: typing.TextIO, bootstrap: bool,
+                   compact: bool = False, cache_stack_top: bool = False,
+                   specialize: bool = False,
+                   template_cache: typing.Optional[TemplateCache] = None,
+                   inline_functions: typing.Optional[typing.Dict] = None) -> None:
     """Translates a single file.
 
     Args:
@@ -19,11 +30,22 @@ def translate_file(input_file: typing.TextIO, output_file: typing.TextIO, bootst
         output_file (typing.TextIO): writes all output to this file.
         bootstrap (bool): if this is True, the current file is the 
             first file we are translating.
+        compact (bool): if this is True, the file is translated in the
+            CodeWriter's compact mode.
+        cache_stack_top (bool): if this is True, the CodeWriter keeps the top
+            of the stack in D between commands.
+        specialize (bool): if this is True, the CodeWriter specializes small
+            segment indices and fuses common pairs of commands.
+        template_cache (typing.Optional[TemplateCache]): the cache of push
+            and pop fragments used by the CodeWriter.
+        inline_functions (typing.Optional[typing.Dict]): the functions which
+            the CodeWriter expands at their call sites.
     """
     # Your code goes here!
     # It might be good to start with something like:
     parser = Parser(input_file)
-    code_writer = CodeWriter(output_file)
+    code_writer = CodeWriter(output_file, compact, cache_stack_top,
+                             specialize, template_cache, inline_functions)
     
     input_filename, _ = os.path.splitext(os.path.basename(input_file.name))
     code_writer.set_file_name(input_filename)
@@ -31,25 +53,61 @@ def translate_file(input_file: typing.TextIO, output_file: typing.TextIO, bootst
     if (bootstrap):
         code_writer.write_bootstrap()
 
-    while parser.has_more_commands():
-        if parser.command_type() == "C_ARITHMETIC":
-            code_writer.write_arithmetic(parser.arg1())
-        elif parser.command_type() in ("C_PUSH", "C_POP"):
-            code_writer.write_push_pop(parser.command_type(), parser.arg1(), int(parser.arg2()))
-        elif parser.command_type() == "C_LABEL":
-            code_writer.write_label(parser.arg1())
-        elif parser.command_type() == "C_GOTO":
-            code_writer.write_goto(parser.arg1())
-        elif parser.command_type() == "C_IF":
-            code_writer.write_if(parser.arg1())
-        elif parser.command_type() == "C_FUNCTION":
-            code_writer.write_function(parser.arg1(), int(parser.arg2()))
-        elif parser.command_type() == "C_RETURN":
-            code_writer.write_return()
-        elif parser.command_type() == "C_CALL":
-            code_writer.write_call(parser.arg1(), int(parser.arg2()))
-        
-        parser.advance()
+    # Every command was decoded once by the parser, and is dispatched on its
+    # type through this table.
+    handlers = {
+        "C_ARITHMETIC": lambda command: code_writer.write_arithmetic(
+            command.arg1),
+        "C_PUSH": lambda command: code_writer.write_push_pop(
+            "C_PUSH", command.arg1, command.arg2),
+        "C_POP": lambda command: code_writer.write_push_pop(
+            "C_POP", command.arg1, command.arg2),
+        "C_LABEL": lambda command: code_writer.write_label(command.arg1),
+        "C_GOTO": lambda command: code_writer.write_goto(command.arg1),
+        "C_IF": lambda command: code_writer.write_if(command.arg1),
+        "C_FUNCTION": lambda command: code_writer.write_function(
+            command.arg1, command.arg2),
+        "C_RETURN": lambda command: code_writer.write_return(),
+        "C_CALL": lambda command: code_writer.write_call(
+            command.arg1, command.arg2)
+    }
+    for command in parser.commands:
+        handlers[command.command_type](command)
+    code_writer.flush_stack_top()
+
+
+def translate_unit(unit: typing.Tuple[str, str], bootstrap: bool,
+                   compact: bool = False, cache_stack_top: bool = False,
+                   specialize: bool = False,
+                   inline_functions: typing.Optional[typing.Dict] = None
+                   ) -> typing.Tuple[str, int, int]:
+    """Translates a single file on its own. Every file has its own CodeWriter,
+    and all the labels it generates are scoped by the file's name or by the
+    names of its functions, so files can be translated in any order, or in
+    parallel, and then concatenated.
+
+    Args:
+        unit (typing.Tuple[str, str]): the path and the content of the file.
+        bootstrap (bool): if this is True, the bootstrap code is written
+            before the translation of the file.
+        compact (bool): see translate_file.
+        cache_stack_top (bool): see translate_file.
+        specialize (bool): see translate_file.
+        inline_functions (typing.Optional[typing.Dict]): see translate_file.
+
+    Returns:
+        typing.Tuple[str, int, int]: the assembly code of the file, and the
+        number of hits and misses in its TemplateCache.
+    """
+    input_path, content = unit
+    input_file = io.StringIO(content)
+    input_file.name = input_path
+    output_file = io.StringIO()
+    template_cache = TemplateCache()
+    translate_file(input_file, output_file, bootstrap, compact,
+                   cache_stack_top, specialize, template_cache,
+                   inline_functions)
+    return output_file.getvalue(), template_cache.hits, template_cache.misses
 
 
 if "__main__" == __name__:
@@ -58,25 +116,124 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    # With --optimize, the whole program is translated into memory first, and
+    # then shrunk by the PeepholeOptimizer, which reports the instructions
+    # saved by each of its rules. With --compact, comparisons, calls and
+    # returns jump to shared routines instead of being inlined. With
+    # --cache-stack-top, the top of the stack is kept in D between commands.
+    # With --specialize, small segment indices get cheaper code, and a push is
+    # fused with a following pop or binary arithmetic command. With --link,
+    # functions which are not reachable from Sys.init are not translated, and
+    # the ROM size of every translated function is reported. With --jobs,
+    # the files are translated on a pool of that many processes, and their
+    # translations are concatenated in the sorted order of their names.
+    # --template-stats reports the usage of the CodeWriters' TemplateCaches.
+    # --hack and --binary encode the translation directly into the machine
+    # words of a ".hack" or a packed ".bin" file, instead of writing ".asm".
+    # With --inline N, leaf functions of at most N commands are expanded at
+    # their call sites instead of being called.
+    argument_parser = argparse.ArgumentParser(prog="VMtranslator")
+    argument_parser.add_argument("input_path")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="run the peephole optimizer over the translated program")
+    argument_parser.add_argument(
+        "--compact", action="store_true",
+        help="share the comparison, call and return code to save ROM space")
+    argument_parser.add_argument(
+        "--cache-stack-top", action="store_true",
+        help="keep the top of the stack in D between commands")
+    argument_parser.add_argument(
+        "--specialize", action="store_true",
+        help="use cheaper code for small indices and common command pairs")
+    argument_parser.add_argument(
+        "--link", action="store_true",
+        help="drop functions unreachable from Sys.init and report ROM sizes")
+    argument_parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="translate files on N processes")
+    argument_parser.add_argument(
+        "--template-stats", action="store_true",
+        help="report the hits and misses of the push and pop fragment caches")
+    argument_parser.add_argument(
+        "--hack", action="store_true",
+        help="write machine code to a .hack file instead of assembly")
+    argument_parser.add_argument(
+        "--binary", action="store_true",
+        help="write little-endian 16-bit machine words to a .bin file")
+    argument_parser.add_argument(
+        "--inline", type=int, default=0, metavar="N",
+        help="inline functions of at most N commands which call no functions")
+    arguments = argument_parser.parse_args()
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+            for filename in sorted(os.listdir(argument_path))]
         output_path = os.path.join(argument_path, os.path.basename(
             argument_path))
     else:
         files_to_translate = [argument_path]
         output_path, extension = os.path.splitext(argument_path)
-    output_path += ".asm"
-    bootstrap = True
-    with open(output_path, 'w') as output_file:
+    files_to_translate = [
+        input_path for input_path in files_to_translate
+        if os.path.splitext(input_path)[1].lower() == ".vm"]
+    inline_functions = {}
+    if arguments.link or arguments.inline > 0:
+        linker = Linker()
         for input_path in files_to_translate:
-            filename, extension = os.path.splitext(input_path)
-            if extension.lower() != ".vm":
-                continue
             with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file, bootstrap)
-            bootstrap = False
+                linker.add_file(input_file)
+        if arguments.inline > 0:
+            inline_functions = linker.inline_functions(arguments.inline)
+        units = linker.link(arguments.link, inline_functions.keys())
+    else:
+        units = []
+        for input_path in files_to_translate:
+            with open(input_path, 'r') as input_file:
+                units.append((input_path, input_file.read()))
+    # Only the first file starts with the bootstrap code.
+    bootstraps = [index == 0 for index in range(len(units))]
+    translate_input_unit = functools.partial(
+        translate_unit, compact=arguments.compact,
+        cache_stack_top=arguments.cache_stack_top,
+        specialize=arguments.specialize, inline_functions=inline_functions)
+    if arguments.jobs is None:
+        results = list(map(translate_input_unit, units, bootstraps))
+    else:
+        if arguments.jobs < 1:
+            argument_parser.error("--jobs must be at least 1")
+        with ProcessPoolExecutor(max_workers=arguments.jobs) as executor:
+            results = list(
+                executor.map(translate_input_unit, units, bootstraps))
+    translations = [translation for translation, _, _ in results]
+    if arguments.optimize or arguments.link:
+        output_lines = "".join(translations).splitlines()
+    if arguments.optimize:
+        optimizer = PeepholeOptimizer()
+        output_lines = optimizer.optimize(output_lines)
+        print(optimizer.report())
+        translations = ["\n".join(output_lines) + "\n"]
+    if arguments.hack or arguments.binary:
+        encoder = HackEncoder()
+        for translation in translations:
+            encoder.write(translation)
+        encoder.finish()
+        if arguments.binary:
+            with open(output_path + ".bin", 'wb') as output_file:
+                encoder.write_binary(output_file)
+        else:
+            with open(output_path + ".hack", 'w') as output_file:
+                encoder.write_text(output_file)
+    else:
+        with open(output_path + ".asm", 'w') as output_file:
+            output_file.writelines(translations)
+    if arguments.link:
+        print(linker.report(output_lines))
+    if arguments.template_stats:
+        # Every file is translated with its own cache, possibly in its own
+        # process, so the totals are gathered here.
+        template_cache = TemplateCache()
+        template_cache.hits = sum(hits for _, hits, _ in results)
+        template_cache.misses = sum(misses for _, _, misses in results)
+        print(template_cache.stats())
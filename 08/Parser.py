@@ -12,6 +12,49 @@ C_COMMAND_PATTERN = re.compile(r"^(?:(.*)=)?([^=;]*)(?:;(.*))?$")
 
 ARITHMETIC_COMMANDS = ["add", "sub", "and", "or", "eq", "gt", "lt", "neg", "not", "shiftleft", "shiftright"]
 
+COMMAND_TYPES = {
+    "push": "C_PUSH",
+    "pop": "C_POP",
+    "label": "C_LABEL",
+    "goto": "C_GOTO",
+    "if-goto": "C_IF",
+    "call": "C_CALL",
+    "function": "C_FUNCTION",
+    "return": "C_RETURN"
+}
+COMMAND_TYPES.update({command: "C_ARITHMETIC" for command in ARITHMETIC_COMMANDS})
+
+
+class Command:
+    """A single decoded VM command. Every line of the input is decoded exactly
+    once into a Command, so the fields can be read any number of times without
+    parsing the line again. Identical lines share the same Command, so it
+    should not be modified.
+    """
+    __slots__ = ("command_type", "arg1", "arg2")
+
+    def __init__(self, line: str) -> None:
+        """Decodes a single command line.
+
+        Args:
+            line (str): a command line, without comments and surrounding white
+                space.
+
+        Raises:
+            ValueError: if the line is not a known VM command.
+        """
+        lineParts = line.split()
+        self.command_type = COMMAND_TYPES.get(lineParts[0])
+        if self.command_type is None:
+            raise ValueError(f"unknown VM command: {line!r}")
+        self.arg1 = self.arg2 = None
+        if self.command_type == "C_ARITHMETIC":
+            self.arg1 = lineParts[0]
+        elif len(lineParts) > 1:
+            self.arg1 = lineParts[1]
+        if len(lineParts) > 2:
+            self.arg2 = int(lineParts[2])
+
 
 class Parser:
     """
@@ -56,16 +99,28 @@ class Parser:
 
         Args:
             input_file (typing.TextIO): input file.
+
+        Raises:
+            ValueError: if a line is not a known VM command.
         """
         # Your code goes here!
         # A good place to start is to read all the lines of the input:
         self.input_lines = input_file.read().splitlines()
         self.delete_comments_and_empty()
+        # VM code repeats the same lines over and over, so every distinct line
+        # is decoded only once.
+        decodedLines = {}
+        self.commands = []
+        for line in self.input_lines:
+            command = decodedLines.get(line)
+            if command is None:
+                command = decodedLines[line] = Command(line)
+            self.commands.append(command)
         
         self.currentLineIndex = 0
         if (self.has_more_commands()):
             self.currentLine = self.input_lines[self.currentLineIndex]
-            self.lineParts = self.currentLine.split()
+            self.currentCommand = self.commands[self.currentLineIndex]
 
     def delete_comments_and_empty(self) -> None:
         self.input_lines = [x.split("//")[0].strip() for x in self.input_lines]
@@ -87,7 +142,7 @@ class Parser:
         self.currentLineIndex += 1
         if (self.has_more_commands()):
             self.currentLine = self.input_lines[self.currentLineIndex]
-            self.lineParts = self.currentLine.split()
+            self.currentCommand = self.commands[self.currentLineIndex]
 
     def command_type(self) -> str:
         """
@@ -98,25 +153,7 @@ class Parser:
             "C_PUSH", "C_POP", "C_LABEL", "C_GOTO", "C_IF", "C_FUNCTION",
             "C_RETURN", "C_CALL".
         """
-
-        if self.lineParts[0] in ARITHMETIC_COMMANDS:
-            return "C_ARITHMETIC"
-        elif self.lineParts[0] == "push":
-            return "C_PUSH"
-        elif self.lineParts[0] == "pop":
-            return "C_POP"
-        elif self.lineParts[0] == "label":
-            return "C_LABEL"
-        elif self.lineParts[0] == "goto":
-            return "C_GOTO"
-        elif self.lineParts[0] == "if-goto":
-            return "C_IF"
-        elif self.lineParts[0] == "call":
-            return "C_CALL"
-        elif self.lineParts[0] == "function":
-            return "C_FUNCTION"
-        elif self.lineParts[0] == "return":
-            return "C_RETURN"
+        return self.currentCommand.command_type
 
     def arg1(self) -> str:
         """
@@ -125,9 +162,7 @@ class Parser:
             "C_ARITHMETIC", the command itself (add, sub, etc.) is returned. 
             Should not be called if the current command is "C_RETURN".
         """
-        if (self.command_type() == "C_ARITHMETIC"):
-            return self.currentLine
-        return self.lineParts[1]
+        return self.currentCommand.arg1
 
     def arg2(self) -> int:
         """
@@ -136,4 +171,4 @@ class Parser:
             called only if the current command is "C_PUSH", "C_POP", 
             "C_FUNCTION" or "C_CALL".
         """
-        return self.lineParts[2]
\ No newline at end of file
+        return self.currentCommand.arg2
\ No newline at end of file
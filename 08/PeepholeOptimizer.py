@@ -0,0 +1,232 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+
+# The end of every push template, immediately followed by the start of every
+# pop template. Together they leave D and SP unchanged, so they are replaced by
+# REPLACED_PUSH_POP, which still stores the value just above the top of the
+# stack (the comparison template reads it from there) and leaves A pointing
+# at it, as the pop would have.
+PUSH_POP = [
+    "@SP", "A=M", "M=D", "@SP", "M=M+1",
+    "@SP", "AM=M-1", "D=M"
+]
+REPLACED_PUSH_POP = ["@SP", "A=M", "M=D"]
+
+RULES = ["push-pop", "redundant-load", "dead-store", "jump-to-next"]
+
+
+def is_label(line: str) -> bool:
+    return line.startswith("(")
+
+
+def is_a_instruction(line: str) -> bool:
+    return line.startswith("@")
+
+
+def split_c_instruction(line: str) -> typing.Tuple[str, str, str]:
+    """
+    Args:
+        line (str): a C-instruction.
+
+    Returns:
+        typing.Tuple[str, str, str]: the dest, comp and jump parts of the
+        instruction, each an empty string if it is missing.
+    """
+    dest, _, rest = line.rpartition("=")
+    comp, _, jump = rest.partition(";")
+    return dest, comp, jump
+
+
+class PeepholeOptimizer:
+    """Shrinks the Hack assembly emitted by the CodeWriter, by repeatedly
+    applying local rewriting rules to the instruction stream:
+    - push-pop: a push immediately followed by a pop cancels out.
+    - redundant-load: "@X" when A already holds X.
+    - dead-store: an instruction which only writes D or A, when the
+      register is overwritten before it is read.
+    - jump-to-next: "@L / 0;JMP" immediately followed by "(L)".
+    Labels are never removed, and a register is never assumed to hold a
+    known value across a label, since it may be reached by a jump. Comment
+    lines are kept, and are moved along when the instruction they precede is
+    removed.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new optimizer, with empty statistics."""
+        self.saved = {rule: 0 for rule in RULES}
+        self.original_count = 0
+        self.optimized_count = 0
+
+    def optimize(self, lines: typing.List[str]) -> typing.List[str]:
+        """Optimizes a complete program.
+
+        Args:
+            lines (typing.List[str]): the lines of the assembly program.
+
+        Returns:
+            typing.List[str]: the lines of the optimized program.
+        """
+        # Every item holds the comment lines which precede a single
+        # instruction or label. The last item is an empty line holding the
+        # trailing comments, and is never removed.
+        items = []
+        comments = []
+        for line in lines:
+            line = line.strip()
+            if line == "":
+                continue
+            if line.startswith("//"):
+                comments.append(line)
+            else:
+                items.append((comments, line))
+                comments = []
+        items.append((comments, ""))
+        self.original_count += self.count_instructions(items)
+
+        changed = True
+        while changed:
+            changed = False
+            for optimization_pass in (
+                    self.cancel_push_pop, self.remove_redundant_loads,
+                    self.remove_dead_stores, self.remove_jumps_to_next):
+                removed = optimization_pass(items)
+                if any(removed):
+                    changed = True
+                    items = self.compact(items, removed)
+
+        self.optimized_count += self.count_instructions(items)
+        result = []
+        for itemComments, line in items:
+            result.extend(itemComments)
+            if line != "":
+                result.append(line)
+        return result
+
+    @staticmethod
+    def count_instructions(items) -> int:
+        return sum(line != "" and not is_label(line) for _, line in items)
+
+    @staticmethod
+    def compact(items, removed: typing.List[bool]):
+        """Drops the removed items, moving their comments to the next item
+        that is kept.
+        """
+        result = []
+        comments = []
+        for (itemComments, line), isRemoved in zip(items, removed):
+            comments = comments + itemComments
+            if not isRemoved:
+                result.append((comments, line))
+                comments = []
+        return result
+
+    def cancel_push_pop(self, items) -> typing.List[bool]:
+        removed = [False] * len(items)
+        patternLength = len(PUSH_POP)
+        i = 0
+        while i + patternLength <= len(items):
+            if all(items[i + j][1] == PUSH_POP[j] for j in range(patternLength)):
+                for j in range(patternLength):
+                    if j < len(REPLACED_PUSH_POP):
+                        items[i + j] = (items[i + j][0], REPLACED_PUSH_POP[j])
+                    else:
+                        removed[i + j] = True
+                self.saved["push-pop"] += patternLength - len(REPLACED_PUSH_POP)
+                i += patternLength
+            else:
+                i += 1
+        return removed
+
+    def remove_redundant_loads(self, items) -> typing.List[bool]:
+        removed = [False] * len(items)
+        knownA = None
+        for i, (_, line) in enumerate(items):
+            if is_label(line):
+                knownA = None
+            elif is_a_instruction(line):
+                if line == knownA:
+                    removed[i] = True
+                    self.saved["redundant-load"] += 1
+                knownA = line
+            elif "A" in split_c_instruction(line)[0]:
+                knownA = None
+        return removed
+
+    def remove_dead_stores(self, items) -> typing.List[bool]:
+        removed = [False] * len(items)
+        for i, (_, line) in enumerate(items):
+            if is_label(line):
+                continue
+            if is_a_instruction(line):
+                register = "A"
+            else:
+                dest, _, jump = split_c_instruction(line)
+                if jump or dest not in ("A", "D"):
+                    continue
+                register = dest
+            if self.is_overwritten_before_read(items, i + 1, register):
+                removed[i] = True
+                self.saved["dead-store"] += 1
+        return removed
+
+    @staticmethod
+    def is_overwritten_before_read(items, start: int, register: str) -> bool:
+        """Is the given register overwritten before it is read, starting at the
+        given item? The search stops at labels and jumps, where the register
+        is assumed to be read.
+        """
+        for index in range(start, len(items)):
+            line = items[index][1]
+            if is_label(line):
+                return False
+            if is_a_instruction(line):
+                if register == "A":
+                    return True
+                continue
+            dest, comp, jump = split_c_instruction(line)
+            if register in comp or jump:
+                return False
+            # M is read and written through A.
+            if register == "A" and ("M" in comp or "M" in dest):
+                return False
+            if register in dest:
+                return True
+        return False
+
+    def remove_jumps_to_next(self, items) -> typing.List[bool]:
+        removed = [False] * len(items)
+        for i in range(len(items) - 2):
+            line = items[i][1]
+            if not is_a_instruction(line) or items[i + 1][1] != "0;JMP":
+                continue
+            target = f"({line[1:]})"
+            j = i + 2
+            found = False
+            while j < len(items) and is_label(items[j][1]):
+                found = found or items[j][1] == target
+                j += 1
+            # The jump also leaves A holding the label's address, so it is only
+            # removed if the code after the label does not depend on it.
+            if found and j < len(items) and is_a_instruction(items[j][1]):
+                removed[i] = removed[i + 1] = True
+                self.saved["jump-to-next"] += 2
+        return removed
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: a human-readable report of the instructions saved by every
+            rule.
+        """
+        lines = [f"{rule}: {self.saved[rule]} instructions saved"
+                 for rule in RULES]
+        lines.append(f"total: {self.original_count} -> {self.optimized_count} "
+                     "instructions")
+        return "\n".join(lines)
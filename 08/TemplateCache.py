@@ -0,0 +1,61 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from collections import OrderedDict
+
+DEFAULT_MAX_TEMPLATES = 1024
+
+
+class TemplateCache:
+    """An in-memory cache of the assembly fragments generated by the
+    CodeWriter for single commands, keyed by the command and its arguments.
+    When the cache grows beyond its maximal size, the least recently used
+    fragments are evicted.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_TEMPLATES) -> None:
+        """Creates an empty cache.
+
+        Args:
+            max_size (int): the maximal number of fragments kept.
+        """
+        self.max_size = max_size
+        self.fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: typing.Hashable,
+               build: typing.Callable[[], str]) -> str:
+        """Looks up a fragment, and counts the lookup as a hit or a miss.
+
+        Args:
+            key (typing.Hashable): identifies the command the fragment
+                translates, including everything the fragment depends on.
+            build (typing.Callable[[], str]): generates the fragment if it is
+                not cached.
+
+        Returns:
+            str: the fragment.
+        """
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            self.fragments.move_to_end(key)
+            self.hits += 1
+            return fragment
+        self.misses += 1
+        fragment = self.fragments[key] = build()
+        if len(self.fragments) > self.max_size:
+            self.fragments.popitem(last=False)
+        return fragment
+
+    def stats(self) -> str:
+        """
+        Returns:
+            str: a short human-readable report of the cache's usage.
+        """
+        return f"templates: {self.hits} hits, {self.misses} misses"
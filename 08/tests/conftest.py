@@ -0,0 +1,113 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import re
+import shutil
+import subprocess
+import sys
+import typing
+import pytest
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSEMBLER_PROJECT = os.path.join(os.path.dirname(PROJECT), "06")
+TRANSLATOR = os.path.join(PROJECT, "Main.py")
+ASSEMBLER = os.path.join(ASSEMBLER_PROJECT, "Main.py")
+# Every test program ends in the usual halting loop well within this many
+# instructions, whatever the translation flags.
+MAX_CYCLES = 100000
+
+# The modules of the project import each other by their file names. The
+# assembler's directory holds the Emulator, but also a Parser and a Main
+# with the same names as the ones here, so both directories are searched
+# last, after the ones added by the assembler's tests, and the translator
+# and the assembler themselves are only run as scripts.
+sys.path.append(PROJECT)
+sys.path.append(ASSEMBLER_PROJECT)
+
+
+def read_test_script(program: str) -> typing.Tuple[
+        typing.Dict[int, int], typing.Dict[int, int]]:
+    """
+    Args:
+        program (str): path of a test program, relative to the project, such
+            as "FunctionCalls/FibonacciElement".
+
+    Returns:
+        typing.Tuple[typing.Dict[int, int], typing.Dict[int, int]]: the RAM
+        values which the program's .tst sets before running, and the RAM
+        values which its .cmp expects after running.
+    """
+    path = os.path.join(PROJECT, program, os.path.basename(program))
+    with open(path + ".tst", 'r') as test_file:
+        script = re.sub(r"//.*", "", test_file.read())
+    initial = {int(address): int(value) for address, value in
+               re.findall(r"set\s+RAM\[(\d+)\]\s+(-?\d+)", script)}
+    with open(path + ".cmp", 'r') as compare_file:
+        rows = [line for line in compare_file.read().splitlines() if line.strip()]
+    expected = {}
+    # The rows alternate between headers, whose names may be truncated, and
+    # values.
+    for header, values in zip(rows[::2], rows[1::2]):
+        addresses = [int(address) for address in re.findall(r"RAM\[(\d+)", header)]
+        expected.update(zip(addresses, map(int, values.strip("|").split("|"))))
+    return initial, expected
+
+
+@pytest.fixture
+def translate(tmp_path) -> typing.Callable[..., typing.Tuple[str, str]]:
+    """
+    Returns:
+        typing.Callable[..., typing.Tuple[str, str]]: translates a copy of a
+        test program with the given command-line flags, and assembles it
+        unless it was encoded directly. Returns the output path without its
+        extension, and the translator's output.
+    """
+    copies = []
+
+    def translate_program(program: str, *flags: str) -> typing.Tuple[str, str]:
+        directory = os.path.join(
+            tmp_path, str(len(copies)), os.path.basename(program))
+        copies.append(directory)
+        # The outputs of earlier translations are not copied, so only the
+        # output of this translation is assembled.
+        shutil.copytree(os.path.join(PROJECT, program), directory,
+                        ignore=shutil.ignore_patterns("*.asm", "*.hack", "*.bin"))
+        result = subprocess.run(
+            [sys.executable, TRANSLATOR, directory, *flags],
+            cwd=PROJECT, capture_output=True, text=True, check=True)
+        output_path = os.path.join(directory, os.path.basename(directory))
+        if os.path.exists(output_path + ".asm"):
+            subprocess.run(
+                [sys.executable, ASSEMBLER, output_path + ".asm"],
+                cwd=ASSEMBLER_PROJECT, capture_output=True, check=True)
+        return output_path, result.stdout
+
+    return translate_program
+
+
+@pytest.fixture
+def check_program() -> typing.Callable[[str, str], None]:
+    """
+    Returns:
+        typing.Callable[[str, str], None]: runs a ".hack" or ".bin" program on
+        the Emulator, with the RAM set up by a test program's .tst, until it
+        halts, and checks the RAM against the test program's .cmp.
+    """
+    from Emulator import Emulator
+
+    def check(input_path: str, program: str) -> None:
+        initial, expected = read_test_script(program)
+        emulator = Emulator.load(input_path)
+        for address, value in initial.items():
+            emulator.write(address, value)
+        emulator.run(MAX_CYCLES)
+        assert emulator.halted
+        assert {address: emulator.read(address) for address in expected} \
+            == expected
+
+    return check
@@ -0,0 +1,60 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import pytest
+from HackEncoder import HackEncoder
+
+
+def encode(*texts):
+    encoder = HackEncoder()
+    for text in texts:
+        encoder.write(text)
+    return list(encoder.finish())
+
+
+def test_partial_lines():
+    # Lines may be split across writes, and the last one needs no newline.
+    assert encode("@LO", "OP // x\n(LOOP)\nD=D", "+A\n@i\nM=D<<\n@LOOP\n0;JMP") \
+        == encode("@LOOP\n(LOOP)\nD=D+A\n@i\nM=D<<\n@LOOP\n0;JMP\n") \
+        == [1, 0b1110000010010000, 16, 0b1010110000001000, 1, 0b1110101010000111]
+
+
+def test_constant_out_of_range():
+    with pytest.raises(ValueError, match="@32768"):
+        encode("@32768\n")
+
+
+def test_invalid_instruction():
+    with pytest.raises(ValueError, match="D=X"):
+        encode("D=X\n")
+
+
+@pytest.mark.parametrize("program", [
+    "FunctionCalls/FibonacciElement", "FunctionCalls/StaticsTest"])
+@pytest.mark.parametrize("flags", [(), ("--compact", "--specialize")])
+def test_matches_assembler(translate, program, flags):
+    assembled_path, _ = translate(program, *flags)
+    encoded_path, _ = translate(program, "--hack", *flags)
+    with open(assembled_path + ".hack", 'r') as assembled_file:
+        assembled = assembled_file.read().split()
+    with open(encoded_path + ".hack", 'r') as encoded_file:
+        assert encoded_file.read().split() == assembled
+    binary_path, _ = translate(program, "--binary", *flags)
+    with open(binary_path + ".bin", 'rb') as binary_file:
+        binary = binary_file.read()
+    assert binary == b"".join(
+        int(word, 2).to_bytes(2, "little") for word in assembled)
+
+
+def test_write_text():
+    encoder = HackEncoder()
+    encoder.write("@5\nD=A\n")
+    encoder.finish()
+    output_file = io.StringIO()
+    encoder.write_text(output_file)
+    assert output_file.getvalue() == "0000000000000101\n1110110000010000"
@@ -0,0 +1,64 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import pytest
+from PeepholeOptimizer import PeepholeOptimizer, PUSH_POP, RULES
+
+
+def optimize(lines):
+    optimizer = PeepholeOptimizer()
+    result = optimizer.optimize(lines)
+    # Every test triggers a single rule.
+    return result, {rule: saved for rule, saved in optimizer.saved.items() if saved}
+
+
+def test_push_pop():
+    lines = ["@5", "D=A"] + PUSH_POP + ["@R13", "M=D"]
+    assert optimize(lines) == (
+        ["@5", "D=A", "@SP", "A=M", "M=D", "@R13", "M=D"], {"push-pop": 5})
+
+
+def test_redundant_load():
+    # A may hold anything after a label.
+    lines = ["@R13", "M=D", "@R13", "D=M", "(LOOP)", "@R13", "M=D"]
+    assert optimize(lines) == (
+        ["@R13", "M=D", "D=M", "(LOOP)", "@R13", "M=D"],
+        {"redundant-load": 1})
+
+
+def test_dead_store():
+    # Removing the first D=M makes its A-instruction dead too.
+    lines = ["@R13", "D=M", "@R14", "D=M", "@R15", "M=D"]
+    assert optimize(lines) == (["@R14", "D=M", "@R15", "M=D"], {"dead-store": 2})
+
+
+def test_jump_to_next():
+    lines = ["// goto END", "@END", "0;JMP", "(END)", "@R13", "M=D"]
+    assert optimize(lines) == (
+        ["// goto END", "(END)", "@R13", "M=D"], {"jump-to-next": 2})
+
+
+def test_jump_to_next_keeps_a():
+    # The code after the label reads the address which the jump left in A.
+    lines = ["@END", "0;JMP", "(END)", "D=A"]
+    assert optimize(lines) == (lines, {})
+
+
+def test_report():
+    optimizer = PeepholeOptimizer()
+    optimizer.optimize(["@END", "0;JMP", "(END)", "@R13", "M=D"])
+    assert optimizer.report().splitlines() == [
+        f"{rule}: {2 if rule == 'jump-to-next' else 0} instructions saved"
+        for rule in RULES] + ["total: 4 -> 2 instructions"]
+
+
+@pytest.mark.parametrize("program", [
+    "FunctionCalls/FibonacciElement", "FunctionCalls/StaticsTest"])
+def test_optimized_program(translate, check_program, program):
+    output_path, report = translate(program, "--optimize")
+    assert "total:" in report
+    check_program(output_path + ".hack", program)
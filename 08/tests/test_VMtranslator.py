@@ -0,0 +1,44 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import subprocess
+import sys
+import pytest
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_unknown_command(tmp_path):
+    input_path = os.path.join(tmp_path, "Bad.vm")
+    with open(input_path, 'w') as input_file:
+        input_file.write("push constant 1\npusj constant 2 // typo\n")
+    result = subprocess.run(
+        [sys.executable, os.path.join(PROJECT, "Main.py"), input_path],
+        cwd=PROJECT, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "ValueError: unknown VM command: 'pusj constant 2'" in result.stderr
+
+
+PROGRAMS = [
+    "FunctionCalls/FibonacciElement", "FunctionCalls/NestedCall",
+    "FunctionCalls/StaticsTest"]
+FLAGS = [
+    (), ("--link",), ("--inline", "8", "--link"), ("--inline", "8"),
+    ("--cache-stack-top",), ("--specialize",),
+    ("--compact", "--cache-stack-top", "--specialize", "--optimize")]
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_translated_program(translate, check_program, program, flags):
+    output_path, _ = translate(program, *flags)
+    check_program(output_path + ".hack", program)
+    parallel_path, _ = translate(program, "--jobs", "2", *flags)
+    with open(output_path + ".asm", 'rb') as output_file, \
+            open(parallel_path + ".asm", 'rb') as parallel_file:
+        assert parallel_file.read() == output_file.read()